@@ -0,0 +1,80 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+""" Measures evaluation of the result checkers (done for every command sent by the observer)
+
+Usage: python3 benchmarks/bench_checkers.py [registered_checkers] [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from foris_controller_netboot_module.observer import commands  # noqa: E402
+from foris_controller_netboot_module.observer.checkers import compile_checker  # noqa: E402
+
+RESPONSE = {"result": True, "ip": "192.168.1.10", "items": [{"id": 1}, {"id": 2}]}
+SPECS = {
+    "match": {"match": [{"path": "result", "value": True}, {"path": "items.1.id", "in": [2]}]},
+    "schema": {
+        "schema": {
+            "type": "object",
+            "required": ["result"],
+            "properties": {
+                "result": {"const": True},
+                "ip": {"type": "string", "pattern": r"^\d+\.\d+\.\d+\.\d+$"},
+                "items": {"type": "array", "items": {"required": ["id"]}},
+            },
+        }
+    },
+}
+
+
+def main():
+    registered = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+
+    commands.register_checkers(
+        {f"module{i}.action": compile_checker(SPECS["match"]) for i in range(registered)}
+    )
+    commands.register_checkers({"bench.match": compile_checker(SPECS["match"])})
+    commands.register_checkers({"bench.schema": compile_checker(SPECS["schema"])})
+
+    cases = [
+        ("default", {"module": "bench", "action": "default"}, {"result": True}),
+        ("match", {"module": "bench", "action": "match"}, RESPONSE),
+        ("schema", {"module": "bench", "action": "schema"}, RESPONSE),
+    ]
+    print(f"registered checkers: {len(commands.CHECK_RESULTS)}, iterations: {iterations}")
+    for name, command, response in cases:
+        assert commands.check_result(command, response)
+        total = timeit.timeit(
+            lambda: commands.check_result(command, response), number=iterations
+        )
+        print(f"{name:7} {total / iterations * 1e6:.2f} us/check")
+
+    compile_time = timeit.timeit(lambda: compile_checker(SPECS["schema"]), number=100) / 100
+    print(f"schema compilation {compile_time * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+""" Compares netboot-manager based device listing with the direct directory scan
+
+Usage: python3 benchmarks/bench_device_list.py [device_count]
+"""
+
+import os
+import shutil
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+# the same path as used by tests/test_root/usr/bin/netboot-manager
+DEVICE_PATH = "/tmp/foris-controller-netboot-test"
+REPEAT = 10
+
+os.environ.setdefault("FORIS_CMDLINE_ROOT", os.path.join(ROOT, "tests", "test_root"))
+sys.path.insert(0, ROOT)
+
+from foris_controller_backends.netboot import NetbootCmds  # noqa: E402
+
+
+def prepare(count: int):
+    shutil.rmtree(DEVICE_PATH, ignore_errors=True)
+    for i in range(count):
+        dir_path = os.path.join(DEVICE_PATH, "%016X" % i)
+        os.makedirs(dir_path)
+        if i % 3 == 1:
+            open(os.path.join(dir_path, "accepted"), "w").close()
+        elif i % 3 == 2:
+            open(os.path.join(dir_path, "transfering"), "w").close()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    prepare(count)
+    cmds = NetbootCmds()
+    try:
+        NetbootCmds.DEVICES_DIR = None
+        manager = timeit.timeit(cmds.list, number=REPEAT) / REPEAT
+        NetbootCmds.DEVICES_DIR = DEVICE_PATH
+        scan = timeit.timeit(cmds.list, number=REPEAT) / REPEAT
+        assert len(cmds.list()) == count
+    finally:
+        shutil.rmtree(DEVICE_PATH, ignore_errors=True)
+
+    print(f"devices: {count}")
+    print(f"netboot-manager: {manager * 1000:.2f} ms")
+    print(f"scandir:         {scan * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+""" Runs many threads doing mixed command_set / command_log / commands_list operations
+
+Usage: python3 benchmarks/bench_lock_contention.py [threads] [operations_per_thread]
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CONTROLLERS = 200
+
+FILE_ROOT = tempfile.mkdtemp(prefix="netboot-bench-")
+os.environ["FORIS_FILE_ROOT"] = FILE_ROOT
+sys.path.insert(0, ROOT)
+
+from foris_controller.app import app_info  # noqa: E402
+
+app_info["lock_backend"] = threading
+app_info["modules"] = {}
+
+from foris_controller_backends.netboot import NetbootFiles  # noqa: E402
+
+
+def worker(files: NetbootFiles, count: int, latencies: dict):
+    for i in range(count):
+        controller_id = "%016X" % random.randrange(CONTROLLERS)
+        operation = random.choice(["set", "log", "list"])
+        start = time.perf_counter()
+        if operation == "set":
+            files.command_set(controller_id, {"module": "mod", "action": "act%d" % (i % 5)})
+        elif operation == "log":
+            record = {"module": "mod", "action": "act0", "result": True}
+            files.command_log(controller_id, "batch%d" % (i % 3), record)
+        else:
+            files.commands_list([controller_id], include_logs=True)
+        latencies[operation].append(time.perf_counter() - start)
+
+
+def main():
+    threads_count = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    files = NetbootFiles()
+    latencies = {"set": [], "log": [], "list": []}
+    threads = [
+        threading.Thread(target=worker, args=(files, count, latencies))
+        for _ in range(threads_count)
+    ]
+    try:
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total = time.perf_counter() - start
+    finally:
+        shutil.rmtree(FILE_ROOT, ignore_errors=True)
+
+    print(f"threads: {threads_count}, operations: {threads_count * count}, total: {total:.2f} s")
+    for operation, values in latencies.items():
+        values.sort()
+        if values:
+            p50 = values[len(values) // 2] * 1000
+            p95 = values[int(len(values) * 0.95)] * 1000
+            print(f"{operation:5} count={len(values)} p50={p50:.2f} ms p95={p95:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
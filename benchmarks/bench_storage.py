@@ -0,0 +1,95 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+""" Compares set / log / list latencies of storage engines for growing number of controllers
+
+Usage: python3 benchmarks/bench_storage.py [operations]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CONTROLLER_COUNTS = [10, 100, 1000, 10000]
+
+os.environ["FORIS_FILE_ROOT"] = tempfile.mkdtemp(prefix="netboot-bench-")
+sys.path.insert(0, ROOT)
+
+from foris_controller.app import app_info  # noqa: E402
+
+app_info["lock_backend"] = threading
+app_info["modules"] = {}
+
+from foris_controller_backends.netboot import create_storage  # noqa: E402
+
+
+def measure(engine: str, controllers: int, count: int) -> dict:
+    file_root = os.environ["FORIS_FILE_ROOT"]
+    shutil.rmtree(file_root, ignore_errors=True)
+    os.makedirs(file_root)
+
+    storage = create_storage(engine)
+    storage.command_set_bulk(
+        [
+            {"controller_id": "%016X" % i, "command": {"module": "mod", "action": "act"}}
+            for i in range(controllers)
+        ]
+    )
+
+    latencies = {"set": [], "log": [], "list": []}
+    for i in range(count):
+        controller_id = "%016X" % (i * 7919 % controllers)
+
+        start = time.perf_counter()
+        storage.command_set(controller_id, {"module": "mod", "action": "act", "data": {"i": i}})
+        latencies["set"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        record = {"module": "mod", "action": "act", "result": True}
+        storage.command_log(controller_id, "batch%d" % (i % 3), record)
+        latencies["log"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        storage.commands_list([controller_id], include_logs=True)
+        latencies["list"].append(time.perf_counter() - start)
+
+    return {k: sorted(v)[len(v) // 2] * 1000 for k, v in latencies.items()}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    try:
+        for engine in ("json", "sqlite"):
+            for controllers in CONTROLLER_COUNTS:
+                p50 = measure(engine, controllers, count)
+                print(
+                    f"{engine:6} controllers={controllers:5} "
+                    + " ".join(f"{k}={v:.2f} ms" for k, v in p50.items())
+                )
+    finally:
+        shutil.rmtree(os.environ["FORIS_FILE_ROOT"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
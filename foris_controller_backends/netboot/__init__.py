@@ -17,23 +17,74 @@
 # Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
 #
 
+import collections
+import contextlib
+import copy
 import logging
 import json
+import os
 import typing
 import pathlib
+import random
+import threading
+import time
+import zlib
 
 from datetime import datetime
 
 from foris_controller.app import app_info
 from foris_controller_backends.cmdline import BaseCmdLine, AsyncCommand
-from foris_controller_backends.files import BaseFile, makedirs, path_exists
-from foris_controller.utils import readlock, writelock, RWLock
+from foris_controller_backends.files import BaseFile, makedirs, path_exists, inject_file_root
+from foris_controller.utils import RWLock
 
 logger = logging.getLogger(__name__)
 
+# optional fields of a command which affect how the observer sends it
+COMMAND_OPTIONS = ("timeout_ms", "retries", "priority", "after")
+
 
 class NetbootCmds(BaseCmdLine):
+    # when set, device states are read directly from this directory
+    # (netboot-manager is used as a fallback)
+    DEVICES_DIR: typing.Optional[str] = os.environ.get("FORIS_NETBOOT_DEVICES_DIR")
+
+    def _scan(self, devices_dir: str) -> typing.Optional[typing.List[dict]]:
+        """ Reads device states from device directory (<serial>/accepted, <serial>/transfering)
+
+        :returns: None if the directory layout is not recognized
+        """
+        accepted, incoming, transfering = [], [], []
+        try:
+            with os.scandir(devices_dir) as it:
+                for entry in it:
+                    if not entry.is_dir():
+                        logger.debug("unknown entry '%s' in device dir", entry.name)
+                        return None
+                    with os.scandir(entry.path) as device_it:
+                        markers = {e.name for e in device_it}
+                    if "accepted" in markers:
+                        accepted.append(entry.name)
+                    if "transfering" in markers:
+                        transfering.append(entry.name)
+                    if "accepted" not in markers and "transfering" not in markers:
+                        incoming.append(entry.name)
+        except OSError:
+            logger.debug("failed to scan device dir '%s'", devices_dir)
+            return None
+
+        return (
+            [{"serial": e, "state": "accepted"} for e in accepted]
+            + [{"serial": e, "state": "incoming"} for e in incoming]
+            + [{"serial": e, "state": "transfering"} for e in transfering]
+        )
+
     def list(self) -> typing.List[dict]:
+        if NetbootCmds.DEVICES_DIR:
+            res = self._scan(NetbootCmds.DEVICES_DIR)
+            if res is not None:
+                return res
+            logger.warning("unknown device dir layout, falling back to netboot-manager")
+
         retval, stdout, _ = self._run_command("/usr/bin/netboot-manager", "list-all", "-j")
         if retval != 0:
             return []
@@ -64,79 +115,444 @@ class NetbootCmds(BaseCmdLine):
         retval, stdout, _ = self._run_command("/usr/bin/netboot-manager", "accept", serial)
         return retval == 0
 
+    def kill_accept(self, serial: str) -> bool:
+        pattern = f"netboot-manager accept {serial}$"
+        retval, _, _ = self._run_command("/usr/bin/pkill", "-f", pattern)
+        return retval == 0
+
+
+class NetbootDeviceRegistry(object):
+    """ In-process cache of netboot device states (serial -> state)
+
+    The list is obtained from netboot-manager and kept for TTL seconds.
+    It should be invalidated explicitly when the device states are changed (accept / revoke).
+    """
+
+    TTL = 10.0  # in seconds
+
+    def __init__(self, cmds: NetbootCmds):
+        self.cmds = cmds
+        self.lock = threading.Lock()
+        self.devices: typing.List[dict] = []
+        self.index: typing.Dict[str, str] = {}
+        self.expires = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _refresh(self):
+        self.devices = self.cmds.list()
+        self.index = {e["serial"]: e["state"] for e in self.devices}
+        self.expires = time.monotonic() + NetbootDeviceRegistry.TTL
+
+    def _get_index(self, refresh: bool = False) -> typing.Dict[str, str]:
+        with self.lock:
+            if refresh or time.monotonic() >= self.expires:
+                self.misses += 1
+                self._refresh()
+            else:
+                self.hits += 1
+            logger.debug("device registry stats: %s", self.stats())
+            return self.index
+
+    def list(self, refresh: bool = False) -> typing.List[dict]:
+        index = self._get_index(refresh)
+        return [{"serial": k, "state": v} for k, v in index.items()]
+
+    def state(self, serial: str) -> typing.Optional[str]:
+        return self._get_index().get(serial)
+
+    def invalidate(self):
+        with self.lock:
+            self.expires = 0.0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.index)}
+
+
+class NetbootInventory(BaseFile):
+    """ Addresses allocated to accepted devices """
+
+    INVENTORY_FILE = "/etc/netboot/inventory.json"
+    lock = RWLock(app_info["lock_backend"])
+
+    def _read(self) -> typing.Dict[str, dict]:
+        if not path_exists(NetbootInventory.INVENTORY_FILE):
+            return {}
+        try:
+            return json.loads(self._file_content(NetbootInventory.INVENTORY_FILE))
+        except ValueError:
+            logger.warning("failed to parse inventory file")
+            return {}
+
+    def _write(self, inventory: typing.Dict[str, dict]):
+        makedirs(str(pathlib.Path(NetbootInventory.INVENTORY_FILE).parent))
+        self._store_to_file(NetbootInventory.INVENTORY_FILE, json.dumps(inventory))
+
+    def get_all(self) -> typing.Dict[str, dict]:
+        with NetbootInventory.lock.readlock:
+            return self._read()
+
+    def store(self, serial: str, record: dict):
+        with NetbootInventory.lock.writelock:
+            inventory = self._read()
+            if inventory.get(serial) != record:
+                inventory[serial] = record
+                self._write(inventory)
+
+    def remove(self, serial: str):
+        with NetbootInventory.lock.writelock:
+            inventory = self._read()
+            if serial in inventory:
+                del inventory[serial]
+                self._write(inventory)
+
 
 class NetbootFiles(BaseFile):
-    command_lock = RWLock(app_info["lock_backend"])
+    # records of each controller are guarded by one of these locks (selected by controller_id)
+    shard_locks = [RWLock(app_info["lock_backend"]) for _ in range(16)]
+    # guards manifest
+    manifest_lock = RWLock(app_info["lock_backend"])
+    # guards command logs
+    log_lock = RWLock(app_info["lock_backend"])
+    migration_lock = threading.Lock()
+
+    # parsed file content shared within the process
+    # path -> (file signature, parsed content)
+    cache_lock = threading.Lock()
+    cache: typing.Dict[str, typing.Tuple[typing.Any, typing.Any]] = {}
 
+    # legacy storage (all controllers in a single file)
     CMDS_FILE = "/etc/netboot/commands.json"
+    # one file per controller + manifest
+    CMDS_DIR = "/etc/netboot/commands"
+    MANIFEST_FILE = "/etc/netboot/commands/manifest.json"
     LOGS_FILE = "/tmp/.netboot/cmd-logs.json"
+    # new log records are appended here and folded into LOGS_FILE when the size is reached
+    LOGS_JOURNAL = "/tmp/.netboot/cmd-logs.journal"
+    LOGS_JOURNAL_MAX_SIZE = 64 * 1024  # in bytes
+    # revision of the whole storage
+    REVISION_FILE = "/tmp/.netboot/revision.json"
+    # revisions of the controllers (kept in memory, 0 until the controller is changed)
+    revision_lock = threading.Lock()
+    revisions: typing.Dict[str, int] = {}
+
+    def _signature(self, path: str) -> typing.Optional[typing.Tuple[int, int, int]]:
+        try:
+            stat = os.stat(inject_file_root(path))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _cache_get(self, key: str, signature: typing.Any) -> typing.Optional[typing.Any]:
+        with NetbootFiles.cache_lock:
+            cached = NetbootFiles.cache.get(key)
+        if cached and cached[0] == signature:
+            return cached[1]
+        return None
+
+    def _cache_set(self, key: str, signature: typing.Any, value: typing.Any):
+        with NetbootFiles.cache_lock:
+            NetbootFiles.cache[key] = (signature, value)
+
+    def _load(self, path: str, parse: typing.Callable[[str], typing.Any]) -> typing.Any:
+        """ Returns parsed file content, the file is parsed again only when it was changed
+
+        Returned content is shared and must not be modified.
+        """
+        signature = self._signature(path)
+        if signature is None:
+            return None
+        value = self._cache_get(path, signature)
+        if value is None:
+            value = parse(self._file_content(path))
+            self._cache_set(path, signature, value)
+        return value
 
     def _read(self, path: str, default=[]) -> dict:
         # create file if not present
         path_object = pathlib.Path(path)
         makedirs(str(path_object.parent))
         if not path_exists(path):
-            self._store_to_file(path, json.dumps(default))
+            self._write(path, default)
 
-        return json.loads(self._file_content(path))
+        return self._load(path, json.loads)
 
-    def _write(self, path: str, content: dict) -> dict:
+    def _write(self, path: str, content: dict, value: typing.Any = None) -> dict:
         self._store_to_file(path, json.dumps(content))
+        self._cache_set(path, self._signature(path), content if value is None else value)
 
-    def _command_exists(
-        self, cmds_list: typing.List[dict], controller_id: str, module: str, action: str
-    ) -> typing.Optional[typing.Tuple[int, dict]]:
-        for cmd_record in cmds_list:
-            if cmd_record["controller_id"] == controller_id:
-                for (idx, record) in enumerate(cmd_record["commands"]):
-                    if record["module"] == module and record["action"] == action:
-                        return idx, cmd_record["commands"]
-                break
-        return None
+    @contextlib.contextmanager
+    def _shard_lock(self, controller_ids: typing.Iterable[str], write: bool):
+        """ Locks shards of selected controllers (always in the same order to avoid deadlocks) """
+        count = len(NetbootFiles.shard_locks)
+        stripes = sorted({zlib.crc32(e.encode()) % count for e in controller_ids})
+        with contextlib.ExitStack() as stack:
+            for stripe in stripes:
+                lock = NetbootFiles.shard_locks[stripe]
+                stack.enter_context(lock.writelock if write else lock.readlock)
+            yield
 
-    @readlock(command_lock, logger)
-    def commands_list(self) -> typing.List[dict]:
-        commands_list = self._read(NetbootFiles.CMDS_FILE)
-        log_list = self._read(NetbootFiles.LOGS_FILE, {})
+    def _shard_path(self, controller_id: str) -> str:
+        return f"{NetbootFiles.CMDS_DIR}/{controller_id}.json"
 
-        for command in commands_list:
-            controller_id = command["controller_id"]
-            command["logs"] = log_list.get(controller_id, [])
+    def _migrate(self):
+        """ Splits legacy commands.json into per-controller shards """
+        with NetbootFiles.migration_lock:
+            if path_exists(NetbootFiles.MANIFEST_FILE) or not path_exists(NetbootFiles.CMDS_FILE):
+                return
 
-        return commands_list
+            logger.info("migrating '%s' to '%s'", NetbootFiles.CMDS_FILE, NetbootFiles.CMDS_DIR)
+            controller_ids = []
+            for record in json.loads(self._file_content(NetbootFiles.CMDS_FILE)):
+                controller_ids.append(record["controller_id"])
+                self._write_controller(
+                    {"controller_id": record["controller_id"], "commands": record["commands"]}
+                )
+            self._write_manifest(controller_ids)
+            os.rename(
+                inject_file_root(NetbootFiles.CMDS_FILE),
+                inject_file_root(NetbootFiles.CMDS_FILE + ".migrated"),
+            )
 
-    @writelock(command_lock, logger)
-    def command_set(
-        self, controller_id: str, command: dict
-    ) -> typing.Optional[typing.Tuple[str, str]]:
-        commands_list = self._read(NetbootFiles.CMDS_FILE)
+    def _read_manifest(self) -> typing.List[str]:
+        self._migrate()
+        return self._read(NetbootFiles.MANIFEST_FILE, {"controllers": []})["controllers"]
+
+    def _write_manifest(self, controller_ids: typing.List[str]):
+        self._write(NetbootFiles.MANIFEST_FILE, {"controllers": controller_ids})
+
+    def _add_to_manifest(self, controller_ids: typing.Iterable[str]):
+        with NetbootFiles.manifest_lock.writelock:
+            manifest = self._read_manifest()
+            new_ids = [e for e in controller_ids if e not in manifest]
+            if new_ids:
+                self._write_manifest(manifest + new_ids)
+
+    @staticmethod
+    def _parse_controller(
+        content: str,
+    ) -> typing.Tuple[dict, typing.Dict[typing.Tuple[str, str], int]]:
+        controller_record = json.loads(content)
+        return controller_record, NetbootFiles._index_controller(controller_record)
+
+    @staticmethod
+    def _index_controller(controller_record: dict) -> typing.Dict[typing.Tuple[str, str], int]:
+        return {
+            (record["module"], record["action"]): idx
+            for idx, record in enumerate(controller_record["commands"])
+        }
+
+    def _read_controller(
+        self, controller_id: str
+    ) -> typing.Tuple[typing.Optional[dict], typing.Dict[typing.Tuple[str, str], int]]:
+        """ Returns controller record and its (module, action) -> position index
 
-        # get controller record
-        controller_record = None
-        for cmd_record in commands_list:
-            if cmd_record["controller_id"] == controller_id:
-                controller_record = cmd_record
-                break
+        Returned record is shared and must not be modified.
+        """
+        loaded = self._load(self._shard_path(controller_id), NetbootFiles._parse_controller)
+        return loaded if loaded else (None, {})
 
+    def _write_controller(self, controller_record: dict):
+        makedirs(NetbootFiles.CMDS_DIR)
+        self._write(
+            self._shard_path(controller_record["controller_id"]),
+            controller_record,
+            (controller_record, NetbootFiles._index_controller(controller_record)),
+        )
+
+    def _copy_controller(
+        self, controller_id: str
+    ) -> typing.Tuple[dict, typing.Dict[typing.Tuple[str, str], int]]:
+        """ Returns a private copy of controller record and its index which can be modified """
+        controller_record, index = self._read_controller(controller_id)
         if not controller_record:
-            controller_record = {"controller_id": controller_id, "commands": [], "logs": []}
-            commands_list.append(controller_record)
+            return {"controller_id": controller_id, "commands": []}, {}
+        copied = {
+            "controller_id": controller_id,
+            "commands": [dict(e) for e in controller_record["commands"]],
+        }
+        if "applied" in controller_record:
+            copied["applied"] = dict(controller_record["applied"])
+        return copied, dict(index)
+
+    def _iter_controllers(
+        self, controller_ids: typing.Optional[typing.List[str]] = None
+    ) -> typing.Iterator[dict]:
+        with NetbootFiles.manifest_lock.readlock:
+            manifest = self._read_manifest()
+        if controller_ids is not None:
+            selected = set(controller_ids)
+            manifest = [e for e in manifest if e in selected]
+        for controller_id in manifest:
+            with self._shard_lock([controller_id], False):
+                controller_record, _ = self._read_controller(controller_id)
+            if controller_record:
+                yield controller_record
+
+    @staticmethod
+    def _fold_log(log_dict: dict, entry: dict):
+        """ Puts journal entry into the per-controller view (up to 10 batches per controller) """
+        logs = log_dict.setdefault(entry["controller_id"], [])
+        batches = [e for e in logs if e["batch_id"] == entry["batch_id"]]
+        if batches:
+            batch_records = batches[0]
+        else:
+            # remove oldest batch if capacity was reached
+            if len(logs) >= 10:
+                logs.pop(0)
+            batch_records = {"batch_id": entry["batch_id"], "records": []}
+            logs.append(batch_records)
+        batch_records["records"].append(entry["record"])
+
+    def _read_journal(self) -> typing.List[dict]:
+        if not path_exists(NetbootFiles.LOGS_JOURNAL):
+            return []
+        return [
+            json.loads(line)
+            for line in self._file_content(NetbootFiles.LOGS_JOURNAL).splitlines()
+            if line
+        ]
+
+    def _read_logs(self, controller_ids: typing.Optional[typing.List[str]] = None) -> dict:
+        """ Reads compacted logs and applies journal tail on top of it
+
+        When controller_ids are set only logs of these controllers are guaranteed to be present.
+        Returned content is shared and must not be modified.
+        """
+        compacted = self._read(NetbootFiles.LOGS_FILE, {})
+        signature = (
+            self._signature(NetbootFiles.LOGS_FILE),
+            self._signature(NetbootFiles.LOGS_JOURNAL),
+        )
+        log_dict = self._cache_get("logs", signature)
+        if log_dict is not None:
+            return log_dict
+
+        if controller_ids is None:
+            log_dict = copy.deepcopy(compacted)
+            for entry in self._read_journal():
+                NetbootFiles._fold_log(log_dict, entry)
+            self._cache_set("logs", signature, log_dict)
+        else:
+            # merge only logs of selected controllers
+            log_dict = {e: copy.deepcopy(compacted.get(e, [])) for e in controller_ids}
+            for entry in self._read_journal():
+                if entry["controller_id"] in log_dict:
+                    NetbootFiles._fold_log(log_dict, entry)
+
+        return log_dict
+
+    def _append_journal(self, entries: typing.List[dict]):
+        path = inject_file_root(NetbootFiles.LOGS_JOURNAL)
+        makedirs(str(pathlib.Path(NetbootFiles.LOGS_JOURNAL).parent))
+        with open(path, "a") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in entries))
+            f.flush()
+            size = f.tell()
+
+        if size >= NetbootFiles.LOGS_JOURNAL_MAX_SIZE:
+            self._compact_logs()
+
+    def _compact_logs(self):
+        logger.debug("compacting '%s'", NetbootFiles.LOGS_JOURNAL)
+        self._write(NetbootFiles.LOGS_FILE, self._read_logs())
+        os.unlink(inject_file_root(NetbootFiles.LOGS_JOURNAL))
+
+    @staticmethod
+    def _log_entry(controller_id: str, batch_id: str, record: dict, stored_time: str) -> dict:
+        entry = {
+            "controller_id": controller_id,
+            "batch_id": batch_id,
+            "record": {
+                "module": record["module"],
+                "action": record["action"],
+                "result": record["result"],
+                "when_stored": stored_time,
+            },
+        }
+        if "attempts" in record:
+            entry["record"]["attempts"] = record["attempts"]
+        return entry
+
+    def _read_revision(self) -> int:
+        """ revision_lock has to be held """
+        # the file doesn't survive reboot, start from current time (in ms)
+        # so that the revision keeps increasing
+        return self._read(NetbootFiles.REVISION_FILE, {"revision": int(time.time() * 1000)})[
+            "revision"
+        ]
+
+    def _bump_revision(self, controller_ids: typing.Iterable[str]):
+        # only the global counter is stored (the cost doesn't grow with number of controllers)
+        with NetbootFiles.revision_lock:
+            revision = self._read_revision() + 1
+            self._write(NetbootFiles.REVISION_FILE, {"revision": revision})
+            for controller_id in controller_ids:
+                NetbootFiles.revisions[controller_id] = revision
+
+    def commands_list(
+        self,
+        controller_ids: typing.Optional[typing.List[str]] = None,
+        include_logs: bool = True,
+        if_revision: typing.Optional[int] = None,
+    ) -> typing.Tuple[int, typing.Optional[typing.List[dict]]]:
+        """
+        :returns: (revision, list of controllers) list is None when if_revision matches
+        """
+        # revisions are read first so they are never newer than the listed content
+        with NetbootFiles.revision_lock:
+            revision = self._read_revision()
+            if if_revision is not None and if_revision == revision:
+                return revision, None
+            if controller_ids is None:
+                revisions = dict(NetbootFiles.revisions)
+            else:
+                revisions = {e: NetbootFiles.revisions.get(e, 0) for e in controller_ids}
+
+        res = []
+        log_list = {}
+        if include_logs:
+            with NetbootFiles.log_lock.readlock:
+                log_list = self._read_logs(controller_ids)
+        for controller_record in self._iter_controllers(controller_ids):
+            record = {
+                "controller_id": controller_record["controller_id"],
+                "commands": controller_record["commands"],
+                "revision": revisions.get(controller_record["controller_id"], 0),
+            }
+            if "applied" in controller_record:
+                record["applied"] = controller_record["applied"]
+            if include_logs:
+                record["logs"] = log_list.get(controller_record["controller_id"], [])
+            res.append(record)
+
+        return revision, res
+
+    def _set_command(
+        self,
+        controller_record: dict,
+        index: typing.Dict[typing.Tuple[str, str], int],
+        command: dict,
+    ) -> dict:
+        """ Updates command within a private copy of controller record """
 
         # find command
-        command_record = None
-        for record in controller_record["commands"]:
-            if record["module"] == command["module"] and record["action"] == command["action"]:
-                command_record = record
-        if not command_record:
+        key = (command["module"], command["action"])
+        idx = index.get(key)
+        if idx is None:
             command_record = {"module": command["module"], "action": command["action"]}
+            index[key] = len(controller_record["commands"])
             controller_record["commands"].append(command_record)
+        else:
+            command_record = controller_record["commands"][idx]
 
         # update command
-        if "data" in command:
-            command_record["data"] = command["data"]
-        else:
-            if "data" in command_record:
-                del command_record["data"]
+        for field in ("data",) + COMMAND_OPTIONS:
+            if field in command:
+                command_record[field] = command[field]
+            else:
+                if field in command_record:
+                    del command_record[field]
 
         module = app_info["modules"].get(command_record["module"])
         if module:
@@ -145,93 +561,585 @@ class NetbootFiles(BaseFile):
             command_record["module_version"] = "?"
         command_record["stored_time"] = datetime.utcnow().isoformat()
 
-        # strore into disk
-        self._write(NetbootFiles.CMDS_FILE, commands_list)
+        return command_record
+
+    def _unset_commands(
+        self, controller_id: str, commands: typing.List[typing.Tuple[str, str]]
+    ) -> typing.List[bool]:
+        """ Removes (module, action) commands of a controller, stores the shard once
+
+        Shard lock of the controller has to be held.
+        """
+        _, index = self._read_controller(controller_id)
+        results = []
+        to_remove = set()
+        for command in commands:
+            results.append(command in index and command not in to_remove)
+            if command in index:
+                to_remove.add(command)
+        if to_remove:
+            controller_record, _ = self._copy_controller(controller_id)
+            controller_record["commands"] = [
+                e
+                for e in controller_record["commands"]
+                if (e["module"], e["action"]) not in to_remove
+            ]
+            self._write_controller(controller_record)
+        return results
+
+    def command_set(
+        self, controller_id: str, command: dict
+    ) -> typing.Optional[typing.Tuple[str, str]]:
+        self._migrate()
+        with self._shard_lock([controller_id], True):
+            # get controller record
+            controller_record, index = self._copy_controller(controller_id)
+
+            command_record = self._set_command(controller_record, index, command)
+
+            # strore into disk (only the controller shard)
+            self._write_controller(controller_record)
+
+        self._add_to_manifest([controller_id])
+        self._bump_revision([controller_id])
 
         return command_record["module_version"], command_record["stored_time"]
 
-    @writelock(command_lock, logger)
+    def command_set_bulk(self, items: typing.List[dict]) -> typing.List[typing.Tuple[str, str]]:
+        """ Sets multiple commands at once (each controller shard is stored only once)
+
+        :param items: [{"controller_id": ..., "command": {...}}, ...]
+        """
+        self._migrate()
+        controller_ids = list(dict.fromkeys(e["controller_id"] for e in items))
+        res = []
+        with self._shard_lock(controller_ids, True):
+            controllers = {e: self._copy_controller(e) for e in controller_ids}
+            for item in items:
+                command_record = self._set_command(
+                    *controllers[item["controller_id"]], item["command"]
+                )
+                res.append((command_record["module_version"], command_record["stored_time"]))
+
+            # strore into disk
+            for controller_record, _ in controllers.values():
+                self._write_controller(controller_record)
+
+        if controller_ids:
+            self._add_to_manifest(controller_ids)
+            self._bump_revision(controller_ids)
+
+        return res
+
     def command_unset(self, controller_id: str, module: str, action: str) -> bool:
-        commands_list = self._read(NetbootFiles.CMDS_FILE)
+        return self.command_unset_bulk(
+            [{"controller_id": controller_id, "module": module, "action": action}]
+        )[0]
+
+    def command_unset_bulk(self, items: typing.List[dict]) -> typing.List[bool]:
+        """ Unsets multiple commands at once (each controller shard is stored only once)
+
+        :param items: [{"controller_id": ..., "module": ..., "action": ...}, ...]
+        """
+        self._migrate()
+        grouped: typing.Dict[str, typing.List[int]] = {}
+        for idx, item in enumerate(items):
+            grouped.setdefault(item["controller_id"], []).append(idx)
 
-        exists = self._command_exists(commands_list, controller_id, module, action)
-        if not exists:
-            return False
+        res = [False] * len(items)
+        with self._shard_lock(grouped.keys(), True):
+            for controller_id, positions in grouped.items():
+                results = self._unset_commands(
+                    controller_id, [(items[e]["module"], items[e]["action"]) for e in positions]
+                )
+                for position, result in zip(positions, results):
+                    res[position] = result
 
-        idx, cmds = exists
-        del cmds[idx]
+        changed = [e for e, positions in grouped.items() if any(res[i] for i in positions)]
+        if changed:
+            self._bump_revision(changed)
 
-        # strore into disk
-        self._write(NetbootFiles.CMDS_FILE, commands_list)
+        return res
+
+    def applied_set(self, controller_id: str, fingerprints: typing.Dict[str, str]) -> bool:
+        """ Stores fingerprints of commands which were successfully applied on the controller
+
+        :param fingerprints: "module.action" -> fingerprint
+        """
+        self._migrate()
+        with self._shard_lock([controller_id], True):
+            controller_record, _ = self._read_controller(controller_id)
+            if not controller_record:
+                return False
+
+            controller_record, _ = self._copy_controller(controller_id)
+            controller_record["applied"] = fingerprints
+            self._write_controller(controller_record)
+
+        self._bump_revision([controller_id])
 
         return True
 
-    @writelock(command_lock, logger)
-    def command_log(self, controller_id: str, batch_id: str, record: dict) -> bool:
-        commands_list = self._read(NetbootFiles.CMDS_FILE)
+    def applied_clear(self, controller_id: str) -> bool:
+        """ Forgets applied fingerprints (device was revoked or accepted again)
 
-        if not self._command_exists(
-            commands_list, controller_id, record["module"], record["action"]
-        ):
-            return None
+        :returns: True if there were some fingerprints
+        """
+        self._migrate()
+        with self._shard_lock([controller_id], True):
+            controller_record, _ = self._read_controller(controller_id)
+            if not controller_record or "applied" not in controller_record:
+                return False
+
+            controller_record, _ = self._copy_controller(controller_id)
+            del controller_record["applied"]
+            self._write_controller(controller_record)
+
+        self._bump_revision([controller_id])
+
+        return True
+
+    def command_log(self, controller_id: str, batch_id: str, record: dict) -> typing.Optional[str]:
+        return self.command_log_batch(controller_id, batch_id, [record])[0]
+
+    def command_log_batch(
+        self, controller_id: str, batch_id: str, records: typing.List[dict]
+    ) -> typing.List[typing.Optional[str]]:
+        """ Logs multiple records of a batch at once
+
+        :returns: stored time for each record (None if the command doesn't exist)
+        """
+        self._migrate()
+        # commands can't be removed while logging
+        with self._shard_lock([controller_id], False):
+            _, index = self._read_controller(controller_id)
+
+            stored_time = datetime.utcnow().isoformat()
+            res = []
+            entries = []
+            for record in records:
+                if (record["module"], record["action"]) in index:
+                    entries.append(self._log_entry(controller_id, batch_id, record, stored_time))
+                    res.append(stored_time)
+                else:
+                    res.append(None)
+
+            if entries:
+                with NetbootFiles.log_lock.writelock:
+                    self._append_journal(entries)
+
+        if entries:
+            self._bump_revision([controller_id])
+
+        return res
+
+
+# storage engine of commands and logs ("json" or "sqlite")
+STORAGE_ENGINE: str = os.environ.get("FORIS_NETBOOT_STORAGE", "json")
 
-        # update log list
-        log_dict = self._read(NetbootFiles.LOGS_FILE, {})
-        logs = log_dict.get(controller_id, [])
-        batches = [e for e in logs if e["batch_id"] == batch_id]
-        if batches:
-            batch_records = batches[0]
-        else:
-            if len(logs) >= 10:
-                logs.pop(0)
-            # remove oldest batch if capacity was reached
-            batch_records = {"batch_id": batch_id, "records": []}
-            logs.append(batch_records)
 
-        stored_time = datetime.utcnow().isoformat()
-        batch_records["records"].append(
+def create_storage(engine: typing.Optional[str] = None):
+    """ Creates storage of netboot commands and logs
+
+    SQLite engine imports the content of JSON storage when its database is empty.
+    """
+    engine = engine or STORAGE_ENGINE
+    if engine == "sqlite":
+        from .sqlite import NetbootSqlite
+
+        return NetbootSqlite(NetbootFiles())
+    elif engine != "json":
+        logger.warning("unknown storage engine '%s' (using json)", engine)
+    return NetbootFiles()
+
+
+class NetbootAcceptStats(object):
+    """ Rolling statistics of accept stages durations """
+
+    WINDOW = 100  # number of the latest samples per stage
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: typing.Dict[str, int] = {}
+        self.samples: typing.Dict[str, typing.Deque[float]] = {}
+
+    def add(self, stage: str, duration_ms: float):
+        with self.lock:
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+            self.samples.setdefault(
+                stage, collections.deque(maxlen=NetbootAcceptStats.WINDOW)
+            ).append(duration_ms)
+
+    def summary(self) -> typing.List[dict]:
+        with self.lock:
+            samples = {k: sorted(v) for k, v in self.samples.items()}
+            counts = dict(self.counts)
+
+        return [
             {
-                "module": record["module"],
-                "action": record["action"],
-                "result": record["result"],
-                "when_stored": stored_time,
+                "stage": stage,
+                "count": counts[stage],
+                "p50_ms": values[len(values) // 2],
+                "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max_ms": values[-1],
             }
-        )
-        log_dict[controller_id] = logs
+            for stage, values in samples.items()
+        ]
+
+
+def _decode(value: typing.Union[str, bytes]) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
 
-        # strore into disk
-        self._write(NetbootFiles.LOGS_FILE, log_dict)
+class NetbootAcceptParser(object):
+    """ Extracts results from netboot-manager accept output (matched line by line) """
 
-        return stored_time
+    ALLOCATED_RE = r"^IP address (\S+) was allocated for (\S+) \(([0-9a-fA-F:]+)\).*$"
+    RESULT_RE = r"^\{.*\}\s*$"
+
+    def __init__(self):
+        self.ip: typing.Optional[str] = None
+        self.mac: typing.Optional[str] = None
+        self.controller_id: typing.Optional[str] = None
+        self.result: typing.Optional[bool] = None
+
+    def allocated(self, matched, process_data=None):
+        self.ip = _decode(matched.group(1))
+        self.mac = _decode(matched.group(3)).lower()
+
+    def final(self, matched, process_data=None):
+        try:
+            parsed = json.loads(_decode(matched.group(0)))
+        except ValueError:
+            logger.warning("failed to parse accept result '%s'", _decode(matched.group(0)))
+            return
+        self.result = parsed.get("result") is True
+        self.controller_id = parsed.get("controller_id", self.controller_id)
+
+    def handlers(self) -> typing.List[typing.Tuple[str, callable]]:
+        return [
+            (NetbootAcceptParser.ALLOCATED_RE, self.allocated),
+            (NetbootAcceptParser.RESULT_RE, self.final),
+        ]
+
+    def succeeded(self, retval: int) -> bool:
+        return retval == 0 and self.result is not False
+
+    def details(self) -> typing.Dict[str, str]:
+        details = {"ip": self.ip, "mac": self.mac, "controller_id": self.controller_id}
+        return {k: v for k, v in details.items() if v is not None}
 
 
 class NetbootAsync(AsyncCommand):
+    stats = NetbootAcceptStats()
+
+    # scheduling of accept processes (key generation shouldn't slow down the router)
+    NICE: typing.Optional[str] = os.environ.get("FORIS_NETBOOT_ACCEPT_NICE")  # e.g. "10"
+    IONICE: typing.Optional[str] = os.environ.get("FORIS_NETBOOT_ACCEPT_IONICE")  # e.g. "2:7"
+    CPUS: typing.Optional[str] = os.environ.get("FORIS_NETBOOT_ACCEPT_CPUS")  # e.g. "1,2"
+    CGROUP: typing.Optional[str] = os.environ.get("FORIS_NETBOOT_ACCEPT_CGROUP")  # cgroup dir
+
+    def _scheduled(self, args: typing.List[str]) -> typing.List[str]:
+        """ Wraps the command to run in the configured scheduling class """
+        if NetbootAsync.NICE:
+            args = ["/usr/bin/nice", "-n", NetbootAsync.NICE] + args
+        if NetbootAsync.IONICE:
+            io_class, _, io_level = NetbootAsync.IONICE.partition(":")
+            io_level_args = ["-n", io_level] if io_level else []
+            args = ["/usr/bin/ionice", "-c", io_class] + io_level_args + args
+        if NetbootAsync.CPUS:
+            args = ["/usr/bin/taskset", "-c", NetbootAsync.CPUS] + args
+        if NetbootAsync.CGROUP:
+            # move the shell into the cgroup and replace it with the command
+            script = 'echo $$ > "$0/cgroup.procs" && exec "$@"'
+            args = ["/bin/sh", "-c", script, NetbootAsync.CGROUP] + args
+        return args
+
     def accept(self, serial: str, notify: callable, reset_notifications: callable) -> str:
-        def handler_exit(process_data):
+        # stage durations are measured from the previous stage (or process start)
+        timing = {"start": time.monotonic()}
+        timing["last"] = timing["start"]
+
+        parser = NetbootAcceptParser()
+
+        def notify_timed(process_data, status: str, details: dict = {}):
+            now = time.monotonic()
+            stage_ms = round((now - timing["last"]) * 1000, 1)
+            elapsed_ms = round((now - timing["start"]) * 1000, 1)
+            timing["last"] = now
+            NetbootAsync.stats.add(status, stage_ms)
+            if status == "succeeded":
+                NetbootAsync.stats.add("total", elapsed_ms)
             notify(
                 {
                     "task_id": process_data.id,
                     "serial": serial,
-                    "status": "succeeded" if process_data.get_retval() == 0 else "failed",
+                    "status": status,
+                    "elapsed_ms": elapsed_ms,
+                    "stage_ms": stage_ms,
+                    **details,
                 }
             )
 
+        def handler_exit(process_data):
+            if parser.succeeded(process_data.get_retval()):
+                notify_timed(process_data, "succeeded", parser.details())
+            else:
+                notify_timed(process_data, "failed")
+
         def gen_handler(status):
             def handler(matched, process_data):
-                notify({"task_id": process_data.id, "status": status, "serial": serial})
+                notify_timed(process_data, status)
 
             return handler
 
         task_id = self.start_process(
-            ["/usr/bin/netboot-manager", "accept", serial],
+            self._scheduled(["/usr/bin/netboot-manager", "accept", serial]),
             [
                 (r"^gen_ca: started.*$", gen_handler("started")),
                 (r"^gen_ca: finished.*$", gen_handler("ca_ready")),
                 (r"^gen_server: finished.*$", gen_handler("server_ready")),
                 (r"^gen_client: finished.*$", gen_handler("client_ready")),
+                *parser.handlers(),
             ],
             handler_exit,
             reset_notifications,
         )
 
         return task_id
+
+
+class NetbootTokenBucket(object):
+    """ Limits the rate of events (tokens are refilled continuously) """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: tokens per minute (unlimited when not positive)
+        :param capacity: max number of tokens which can be taken at once
+        """
+        self.rate = rate / 60.0
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        """ Tries to take a token
+
+        :returns: 0.0 when the token was taken otherwise seconds until a token is available
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return 0.0
+            return (1.0 - self.tokens) / self.rate
+
+
+class NetbootAcceptQueue(object):
+    """ Runs accepts with bounded parallelism (key generation is CPU intensive)
+
+    Jobs are keyed by serial so that the same device is never accepted twice at once.
+    """
+
+    CONCURRENCY: int = int(os.environ.get("FORIS_NETBOOT_ACCEPT_CONCURRENCY", 0)) or (
+        os.cpu_count() or 1
+    )
+    FINAL_STATUSES = ("succeeded", "failed", "cancelled")
+    KILL_TIMEOUT = 10.0  # in seconds
+
+    # global budget of started accepts
+    RATE: float = float(os.environ.get("FORIS_NETBOOT_ACCEPT_RATE", 0))  # per minute
+    BURST: float = float(os.environ.get("FORIS_NETBOOT_ACCEPT_BURST", 0)) or CONCURRENCY
+    budget = NetbootTokenBucket(RATE, BURST)
+
+    def __init__(self, cmds: NetbootCmds, async_cmds: NetbootAsync):
+        self.cmds = cmds
+        self.async_cmds = async_cmds
+        self.lock = threading.Lock()
+        self.jobs: typing.Dict[str, dict] = {}  # serial -> job
+        self.pending: typing.Deque[dict] = collections.deque()
+        self.running = 0
+        self.budget_timer: typing.Optional[threading.Timer] = None
+
+    def submit(
+        self,
+        serial: str,
+        notify: callable,
+        reset_notifications: callable,
+        finished: typing.Optional[callable] = None,
+    ) -> str:
+        """ Enqueues accept (or attaches to the job which is already queued or running)
+
+        :param finished: called with serial, task_id and final status when the job ends
+        :returns: task_id
+        """
+        with self.lock:
+            job = self.jobs.get(serial)
+            if job:
+                logger.debug("accept of '%s' is already in progress (%s)", serial, job["task_id"])
+                position = None
+            else:
+                job = {
+                    "task_id": "%08X" % random.randrange(2 ** 32),
+                    "serial": serial,
+                    "notify": notify,
+                    "reset_notifications": reset_notifications,
+                    "finished": [],
+                    "running": False,
+                    "cancelled": False,
+                }
+                self.jobs[serial] = job
+                self.pending.append(job)
+                position = len(self.pending)
+            if finished:
+                job["finished"].append(finished)
+            logger.debug("accept queue: %d running, %d pending", self.running, len(self.pending))
+
+        self._start_next()
+
+        with self.lock:
+            queued = position is not None and not job["running"] and not job["cancelled"]
+        if queued:
+            notify(
+                {
+                    "task_id": job["task_id"],
+                    "status": "queued",
+                    "serial": serial,
+                    "position": position,
+                }
+            )
+
+        return job["task_id"]
+
+    def submit_batch(
+        self,
+        serials: typing.List[str],
+        notify: callable,
+        notify_batch: callable,
+        reset_notifications: callable,
+    ) -> typing.Tuple[str, typing.List[typing.Tuple[str, str]]]:
+        batch_id = "%08X" % random.randrange(2 ** 32)
+        serials = list(dict.fromkeys(serials))  # remove duplicates
+        lock = threading.Lock()
+        results: typing.Dict[str, typing.Tuple[str, str]] = {}
+
+        def finished(serial: str, task_id: str, status: str):
+            with lock:
+                results[serial] = (task_id, status)
+                if len(results) < len(serials):
+                    return
+            notify_batch(
+                {
+                    "task_id": batch_id,
+                    "results": [
+                        {"serial": e, "task_id": results[e][0], "status": results[e][1]}
+                        for e in serials
+                    ],
+                }
+            )
+
+        tasks = [(e, self.submit(e, notify, reset_notifications, finished)) for e in serials]
+        return batch_id, tasks
+
+    def cancel(self, task_id: str) -> bool:
+        """ Drops queued job or kills the running accept process """
+        with self.lock:
+            jobs = [e for e in self.jobs.values() if e["task_id"] == task_id]
+            if not jobs or jobs[0]["cancelled"] or "killing" in jobs[0]:
+                return False
+            job = jobs[0]
+            if job["running"]:
+                # final notification waits until the result of the kill is known
+                killing = job["killing"] = threading.Event()
+            else:
+                job["cancelled"] = True
+                self.pending.remove(job)
+
+        if not job["cancelled"]:
+            # exit handler of the process reports the job as cancelled
+            # (only when the process was really killed)
+            killed = self.cmds.kill_accept(job["serial"])
+            with self.lock:
+                job["cancelled"] = killed
+                del job["killing"]
+            killing.set()
+            return killed
+
+        job["notify"]({"task_id": task_id, "status": "cancelled", "serial": job["serial"]})
+        self._finished(job, "cancelled")
+        return True
+
+    def _start_next(self):
+        while True:
+            with self.lock:
+                if not self.pending or self.running >= NetbootAcceptQueue.CONCURRENCY:
+                    return
+
+                now = time.monotonic()
+                wait = NetbootAcceptQueue.budget.take()
+                if wait > 0.0:
+                    # slot is free, but the accept budget is exhausted
+                    self.pending[0].setdefault("budget_since", now)
+                    if not self.budget_timer:
+                        logger.debug("accept budget exhausted, waiting %.1f s", wait)
+                        self.budget_timer = threading.Timer(wait, self._budget_refilled)
+                        self.budget_timer.daemon = True
+                        self.budget_timer.start()
+                    return
+
+                job = self.pending.popleft()
+                job["running"] = True
+                job["budget_wait_ms"] = round((now - job.get("budget_since", now)) * 1000, 1)
+                self.running += 1
+
+            if NetbootAcceptQueue.RATE > 0:
+                self.async_cmds.stats.add("budget_wait", job["budget_wait_ms"])
+
+            def job_notify(msg: dict, job=job):
+                status = msg["status"]
+                if status in NetbootAcceptQueue.FINAL_STATUSES:
+                    with self.lock:
+                        killing = job.get("killing")
+                    if killing:
+                        killing.wait(NetbootAcceptQueue.KILL_TIMEOUT)
+                    # device which was accepted before the kill stays accepted
+                    if job["cancelled"] and status != "succeeded":
+                        status = "cancelled"
+                job["notify"](
+                    dict(
+                        msg,
+                        task_id=job["task_id"],
+                        status=status,
+                        budget_wait_ms=job["budget_wait_ms"],
+                    )
+                )
+                if status in NetbootAcceptQueue.FINAL_STATUSES:
+                    self._finished(job, status)
+
+            try:
+                self.async_cmds.accept(job["serial"], job_notify, job["reset_notifications"])
+            except Exception:
+                logger.exception("failed to start accept of '%s'", job["serial"])
+                job_notify({"task_id": job["task_id"], "status": "failed", "serial": job["serial"]})
+
+    def _budget_refilled(self):
+        with self.lock:
+            self.budget_timer = None
+        self._start_next()
+
+    def _finished(self, job: dict, status: str):
+        with self.lock:
+            del self.jobs[job["serial"]]
+            if job["running"]:
+                self.running -= 1
+
+        for finished in job["finished"]:
+            finished(job["serial"], job["task_id"], status)
+
+        self._start_next()
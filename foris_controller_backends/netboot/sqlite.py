@@ -0,0 +1,446 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import contextlib
+import json
+import logging
+import pathlib
+import sqlite3
+import threading
+import time
+import typing
+
+from datetime import datetime
+
+from foris_controller.app import app_info
+from foris_controller_backends.files import makedirs, inject_file_root
+from foris_controller_backends.netboot import COMMAND_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+# commands are persistent
+COMMANDS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS controllers (
+    controller_id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    applied TEXT
+);
+CREATE INDEX IF NOT EXISTS controllers_position ON controllers (position);
+CREATE TABLE IF NOT EXISTS commands (
+    controller_id TEXT NOT NULL,
+    module TEXT NOT NULL,
+    action TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT,
+    options TEXT,
+    module_version TEXT NOT NULL,
+    stored_time TEXT NOT NULL,
+    PRIMARY KEY (controller_id, module, action)
+);
+CREATE INDEX IF NOT EXISTS commands_position ON commands (controller_id, position);
+"""
+
+# logs and revisions are not persistent (stored in /tmp)
+LOGS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs.batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    controller_id TEXT NOT NULL,
+    batch_id TEXT NOT NULL,
+    UNIQUE (controller_id, batch_id)
+);
+CREATE TABLE IF NOT EXISTS logs.records (
+    batch INTEGER NOT NULL REFERENCES batches (id) ON DELETE CASCADE,
+    module TEXT NOT NULL,
+    action TEXT NOT NULL,
+    result INTEGER NOT NULL,
+    attempts INTEGER,
+    when_stored TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS logs.records_batch ON records (batch);
+CREATE TABLE IF NOT EXISTS logs.revisions (
+    controller_id TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL
+);
+"""
+
+# revision of the whole storage is stored under this controller_id
+GLOBAL_REVISION = ""
+
+
+class NetbootSqlite(object):
+    """ Storage of netboot commands and logs in SQLite
+
+    It provides the same methods as NetbootFiles.
+    """
+
+    DB_FILE = "/etc/netboot/commands.db"
+    LOGS_DB_FILE = "/tmp/.netboot/cmd-logs.db"
+    MAX_BATCHES = 10
+
+    import_lock = threading.Lock()
+    imported = False
+
+    def __init__(self, json_source=None):
+        """
+        :param json_source: NetbootFiles instance which is imported when the database is empty
+        """
+        self.json_source = json_source
+        self.local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # connections can't be shared among threads
+        connection = getattr(self.local, "connection", None)
+        if connection:
+            return connection
+
+        for path in (NetbootSqlite.DB_FILE, NetbootSqlite.LOGS_DB_FILE):
+            makedirs(str(pathlib.Path(path).parent))
+
+        connection = sqlite3.connect(
+            inject_file_root(NetbootSqlite.DB_FILE), timeout=30.0, isolation_level=None
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "ATTACH DATABASE ? AS logs", (inject_file_root(NetbootSqlite.LOGS_DB_FILE),)
+        )
+        connection.execute("PRAGMA logs.journal_mode=WAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        connection.executescript(COMMANDS_SCHEMA + LOGS_SCHEMA)
+        # logs database doesn't survive reboot, start from current time (in ms)
+        # so that the revision keeps increasing
+        if not connection.execute(
+            "SELECT 1 FROM revisions WHERE controller_id = ?", (GLOBAL_REVISION,)
+        ).fetchone():
+            connection.execute(
+                "INSERT OR IGNORE INTO revisions (controller_id, revision) VALUES (?, ?)",
+                (GLOBAL_REVISION, int(time.time() * 1000)),
+            )
+        self.local.connection = connection
+
+        self._import_json()
+        return connection
+
+    @contextlib.contextmanager
+    def _transaction(self, write: bool = False):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield connection
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _import_json(self):
+        """ One-shot import of the JSON storage into an empty database """
+        with NetbootSqlite.import_lock:
+            if NetbootSqlite.imported or self.json_source is None:
+                return
+            NetbootSqlite.imported = True
+
+            with self._transaction(True) as connection:
+                if connection.execute("SELECT 1 FROM controllers LIMIT 1").fetchone():
+                    return
+                _, controllers = self.json_source.commands_list(include_logs=False)
+                logger.info("importing %d controllers from JSON storage", len(controllers))
+                for controller in controllers:
+                    self._insert_controller(connection, controller["controller_id"])
+                    if "applied" in controller:
+                        connection.execute(
+                            "UPDATE controllers SET applied = ? WHERE controller_id = ?",
+                            (json.dumps(controller["applied"]), controller["controller_id"]),
+                        )
+                    for command in controller["commands"]:
+                        self._store_command(connection, controller["controller_id"], command)
+
+    def _insert_controller(self, connection: sqlite3.Connection, controller_id: str):
+        connection.execute(
+            "INSERT OR IGNORE INTO controllers (controller_id, position) "
+            "VALUES (?, (SELECT IFNULL(MAX(position), -1) + 1 FROM controllers))",
+            (controller_id,),
+        )
+
+    def _store_command(self, connection: sqlite3.Connection, controller_id: str, command: dict):
+        data = json.dumps(command["data"]) if "data" in command else None
+        options = {k: command[k] for k in COMMAND_OPTIONS if k in command}
+        options = json.dumps(options) if options else None
+        updated = connection.execute(
+            "UPDATE commands SET data = ?, options = ?, module_version = ?, stored_time = ? "
+            "WHERE controller_id = ? AND module = ? AND action = ?",
+            (
+                data,
+                options,
+                command["module_version"],
+                command["stored_time"],
+                controller_id,
+                command["module"],
+                command["action"],
+            ),
+        ).rowcount
+        if not updated:
+            connection.execute(
+                "INSERT INTO commands "
+                "(controller_id, module, action, position, data, options, module_version, "
+                "stored_time) "
+                "VALUES (?, ?, ?, (SELECT IFNULL(MAX(position), -1) + 1 FROM commands "
+                "WHERE controller_id = ?), ?, ?, ?, ?)",
+                (
+                    controller_id,
+                    command["module"],
+                    command["action"],
+                    controller_id,
+                    data,
+                    options,
+                    command["module_version"],
+                    command["stored_time"],
+                ),
+            )
+
+    def _bump_revision(self, connection: sqlite3.Connection, controller_ids: typing.Iterable[str]):
+        revision = self._read_revision(connection) + 1
+        connection.executemany(
+            "INSERT OR REPLACE INTO revisions (controller_id, revision) VALUES (?, ?)",
+            [(e, revision) for e in [GLOBAL_REVISION, *controller_ids]],
+        )
+
+    def _read_revision(self, connection: sqlite3.Connection) -> int:
+        # seeded when the connection is created
+        return connection.execute(
+            "SELECT revision FROM revisions WHERE controller_id = ?", (GLOBAL_REVISION,)
+        ).fetchone()[0]
+
+    def _read_logs(
+        self, connection: sqlite3.Connection, controller_ids: typing.Optional[typing.List[str]]
+    ) -> typing.Dict[str, typing.List[dict]]:
+        query = (
+            "SELECT b.id, b.controller_id, b.batch_id, "
+            "r.module, r.action, r.result, r.attempts, r.when_stored "
+            "FROM batches b LEFT JOIN records r ON r.batch = b.id "
+        )
+        params: typing.List[str] = []
+        if controller_ids is not None:
+            query += "WHERE b.controller_id IN (%s) " % ",".join("?" * len(controller_ids))
+            params = controller_ids
+        query += "ORDER BY b.id, r.rowid"
+
+        logs: typing.Dict[str, typing.List[dict]] = {}
+        batches: typing.Dict[int, dict] = {}
+        for batch, controller_id, batch_id, module, action, result, attempts, when_stored in (
+            connection.execute(query, params)
+        ):
+            if batch not in batches:
+                batches[batch] = {"batch_id": batch_id, "records": []}
+                logs.setdefault(controller_id, []).append(batches[batch])
+            if module is not None:
+                record = {
+                    "module": module,
+                    "action": action,
+                    "result": bool(result),
+                    "when_stored": when_stored,
+                }
+                if attempts is not None:
+                    record["attempts"] = attempts
+                batches[batch]["records"].append(record)
+        return logs
+
+    def commands_list(
+        self,
+        controller_ids: typing.Optional[typing.List[str]] = None,
+        include_logs: bool = True,
+        if_revision: typing.Optional[int] = None,
+    ) -> typing.Tuple[int, typing.Optional[typing.List[dict]]]:
+        # deferred transaction, reads don't wait for writers (WAL)
+        with self._transaction() as connection:
+            revision = self._read_revision(connection)
+            if if_revision is not None and if_revision == revision:
+                return revision, None
+
+            controllers_query = (
+                "SELECT c.controller_id, c.applied, IFNULL(r.revision, 0) FROM controllers c "
+                "LEFT JOIN revisions r ON r.controller_id = c.controller_id "
+            )
+            commands_query = (
+                "SELECT controller_id, module, action, data, options, module_version, stored_time "
+                "FROM commands "
+            )
+            params: typing.List[str] = []
+            if controller_ids is not None:
+                placeholders = ",".join("?" * len(controller_ids))
+                controllers_query += "WHERE c.controller_id IN (%s) " % placeholders
+                commands_query += "WHERE controller_id IN (%s) " % placeholders
+                params = controller_ids
+            controllers_query += "ORDER BY c.position"
+            commands_query += "ORDER BY controller_id, position"
+
+            res = []
+            records = {}
+            for controller_id, applied, controller_revision in connection.execute(
+                controllers_query, params
+            ):
+                record = {
+                    "controller_id": controller_id,
+                    "commands": [],
+                    "revision": controller_revision,
+                }
+                if applied is not None:
+                    record["applied"] = json.loads(applied)
+                records[controller_id] = record
+                res.append(record)
+
+            for controller_id, module, action, data, options, module_version, stored_time in (
+                connection.execute(commands_query, params)
+            ):
+                command = {
+                    "module": module,
+                    "action": action,
+                    "module_version": module_version,
+                    "stored_time": stored_time,
+                }
+                if data is not None:
+                    command["data"] = json.loads(data)
+                if options is not None:
+                    command.update(json.loads(options))
+                records[controller_id]["commands"].append(command)
+
+            if include_logs:
+                logs = self._read_logs(connection, controller_ids)
+                for record in res:
+                    record["logs"] = logs.get(record["controller_id"], [])
+
+        return revision, res
+
+    def _command_record(self, connection: sqlite3.Connection, controller_id, command) -> dict:
+        command_record = {"module": command["module"], "action": command["action"]}
+        for field in ("data",) + COMMAND_OPTIONS:
+            if field in command:
+                command_record[field] = command[field]
+        module = app_info["modules"].get(command_record["module"])
+        command_record["module_version"] = module.version if module else "?"
+        command_record["stored_time"] = datetime.utcnow().isoformat()
+        self._store_command(connection, controller_id, command_record)
+        return command_record
+
+    def command_set(
+        self, controller_id: str, command: dict
+    ) -> typing.Optional[typing.Tuple[str, str]]:
+        return self.command_set_bulk([{"controller_id": controller_id, "command": command}])[0]
+
+    def command_set_bulk(self, items: typing.List[dict]) -> typing.List[typing.Tuple[str, str]]:
+        res = []
+        with self._transaction(True) as connection:
+            for item in items:
+                self._insert_controller(connection, item["controller_id"])
+                command_record = self._command_record(
+                    connection, item["controller_id"], item["command"]
+                )
+                res.append((command_record["module_version"], command_record["stored_time"]))
+            if items:
+                self._bump_revision(connection, {e["controller_id"] for e in items})
+        return res
+
+    def command_unset(self, controller_id: str, module: str, action: str) -> bool:
+        return self.command_unset_bulk(
+            [{"controller_id": controller_id, "module": module, "action": action}]
+        )[0]
+
+    def command_unset_bulk(self, items: typing.List[dict]) -> typing.List[bool]:
+        res = []
+        with self._transaction(True) as connection:
+            for item in items:
+                deleted = connection.execute(
+                    "DELETE FROM commands WHERE controller_id = ? AND module = ? AND action = ?",
+                    (item["controller_id"], item["module"], item["action"]),
+                ).rowcount
+                res.append(deleted > 0)
+            changed = {e["controller_id"] for e, deleted in zip(items, res) if deleted}
+            if changed:
+                self._bump_revision(connection, changed)
+        return res
+
+    def applied_set(self, controller_id: str, fingerprints: typing.Dict[str, str]) -> bool:
+        with self._transaction(True) as connection:
+            updated = connection.execute(
+                "UPDATE controllers SET applied = ? WHERE controller_id = ?",
+                (json.dumps(fingerprints), controller_id),
+            ).rowcount
+            if updated:
+                self._bump_revision(connection, [controller_id])
+        return updated > 0
+
+    def applied_clear(self, controller_id: str) -> bool:
+        with self._transaction(True) as connection:
+            updated = connection.execute(
+                "UPDATE controllers SET applied = NULL "
+                "WHERE controller_id = ? AND applied IS NOT NULL",
+                (controller_id,),
+            ).rowcount
+            if updated:
+                self._bump_revision(connection, [controller_id])
+        return updated > 0
+
+    def command_log(self, controller_id: str, batch_id: str, record: dict) -> typing.Optional[str]:
+        return self.command_log_batch(controller_id, batch_id, [record])[0]
+
+    def command_log_batch(
+        self, controller_id: str, batch_id: str, records: typing.List[dict]
+    ) -> typing.List[typing.Optional[str]]:
+        stored_time = datetime.utcnow().isoformat()
+        res = []
+        with self._transaction(True) as connection:
+            to_store = []
+            for record in records:
+                exists = connection.execute(
+                    "SELECT 1 FROM commands WHERE controller_id = ? AND module = ? AND action = ?",
+                    (controller_id, record["module"], record["action"]),
+                ).fetchone()
+                res.append(stored_time if exists else None)
+                if exists:
+                    to_store.append(record)
+            if not to_store:
+                return res
+
+            row = connection.execute(
+                "SELECT id FROM batches WHERE controller_id = ? AND batch_id = ?",
+                (controller_id, batch_id),
+            ).fetchone()
+            if row:
+                batch = row[0]
+            else:
+                batch = connection.execute(
+                    "INSERT INTO batches (controller_id, batch_id) VALUES (?, ?)",
+                    (controller_id, batch_id),
+                ).lastrowid
+                # remove oldest batches if capacity was reached
+                connection.execute(
+                    "DELETE FROM batches WHERE controller_id = ? AND id NOT IN "
+                    "(SELECT id FROM batches WHERE controller_id = ? ORDER BY id DESC LIMIT ?)",
+                    (controller_id, controller_id, NetbootSqlite.MAX_BATCHES),
+                )
+
+            connection.executemany(
+                "INSERT INTO records (batch, module, action, result, attempts, when_stored) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (batch, e["module"], e["action"], e["result"], e.get("attempts"), stored_time)
+                    for e in to_store
+                ],
+            )
+            self._bump_revision(connection, [controller_id])
+        return res
@@ -34,6 +34,28 @@ class NetbootModule(BaseModule):
 
         return {"task_id": async_id}
 
+    def action_accept_batch(self, data):
+        def notify(msg: dict):
+            self.notify("accept", msg)
+
+        def notify_batch(msg: dict):
+            self.notify("accept_batch", msg)
+
+        batch_id, tasks = self.handler.accept_batch(
+            data["serials"], notify, notify_batch, self.reset_notify
+        )
+
+        return {
+            "task_id": batch_id,
+            "tasks": [{"serial": serial, "task_id": task_id} for serial, task_id in tasks],
+        }
+
+    def action_cancel_accept(self, data):
+        return {"result": self.handler.cancel_accept(data["task_id"])}
+
+    def action_accept_stats(self, data):
+        return {"stages": self.handler.accept_stats()}
+
     def action_revoke(self, data):
         res = {}
         res = self.handler.revoke(data["serial"])
@@ -45,7 +67,13 @@ class NetbootModule(BaseModule):
         return {"devices": self.handler.list()}
 
     def action_commands_list(self, data: dict) -> dict:
-        return {"controllers": self.handler.commands_list()}
+        data = data or {}
+        revision, controllers = self.handler.commands_list(
+            data.get("controller_ids"), data.get("include_logs", True), data.get("if_revision")
+        )
+        if controllers is None:
+            return {"not_modified": True, "revision": revision}
+        return {"controllers": controllers, "revision": revision}
 
     def action_command_set(self, data: dict) -> dict:
         res = self.handler.command_set(**data)
@@ -60,6 +88,34 @@ class NetbootModule(BaseModule):
             self.notify("command_unset", data)
         return {"result": res}
 
+    def action_command_set_bulk(self, data: dict) -> dict:
+        res = self.handler.command_set_bulk(data["commands"])
+        results = []
+        stored = []
+        for item, item_res in zip(data["commands"], res):
+            results.append(
+                {
+                    "controller_id": item["controller_id"],
+                    "module": item["command"]["module"],
+                    "action": item["command"]["action"],
+                    "result": True if item_res else False,
+                }
+            )
+            if item_res is not None:
+                item["command"]["module_version"], item["command"]["stored_time"] = item_res
+                stored.append(item)
+        if stored:
+            self.notify("command_set_bulk", {"commands": stored})
+        return {"results": results}
+
+    def action_command_unset_bulk(self, data: dict) -> dict:
+        res = self.handler.command_unset_bulk(data["commands"])
+        results = [dict(item, result=item_res) for item, item_res in zip(data["commands"], res)]
+        unset = [item for item, item_res in zip(data["commands"], res) if item_res]
+        if unset:
+            self.notify("command_unset_bulk", {"commands": unset})
+        return {"results": results}
+
     def action_command_log(self, data: dict) -> dict:
         res = self.handler.command_log(**data)
         if res is not None:
@@ -67,9 +123,48 @@ class NetbootModule(BaseModule):
             self.notify("command_log", data)
         return {"result": True if res else False}
 
+    def action_command_log_batch(self, data: dict) -> dict:
+        res = self.handler.command_log_batch(**data)
+        stored = []
+        for record, when_stored in zip(data["records"], res):
+            if when_stored is not None:
+                record["when_stored"] = when_stored
+                stored.append(record)
+        if stored:
+            self.notify(
+                "command_log_batch",
+                {
+                    "controller_id": data["controller_id"],
+                    "batch_id": data["batch_id"],
+                    "records": stored,
+                },
+            )
+        return {"results": [e is not None for e in res]}
+
+    def action_applied_set(self, data: dict) -> dict:
+        res = self.handler.applied_set(**data)
+        if res:
+            self.notify("applied_set", data)
+        return {"result": res}
+
 
 @wrap_required_functions(
-    ["revoke", "accept", "list", "commands_list", "command_set", "command_unset", "command_log"]
+    [
+        "revoke",
+        "accept",
+        "accept_batch",
+        "cancel_accept",
+        "accept_stats",
+        "list",
+        "commands_list",
+        "command_set",
+        "command_set_bulk",
+        "command_unset",
+        "command_unset_bulk",
+        "command_log",
+        "command_log_batch",
+        "applied_set",
+    ]
 )
 class Handler(object):
     pass
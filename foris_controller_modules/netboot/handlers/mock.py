@@ -37,11 +37,27 @@ class MockNetbootHandler(Handler, BaseMockHandler):
         "0000000D30000299": "accepted",
         "0000000D3000028E": "transfering",
     }
+    inventory: typing.Dict[str, dict] = {}
     controllers: typing.List[dict] = []
+    revision: int = 0
+    revisions: typing.Dict[str, int] = {}
+
+    def _bump_revision(self, controller_id: str):
+        MockNetbootHandler.revision += 1
+        MockNetbootHandler.revisions[controller_id] = MockNetbootHandler.revision
+
+    def _applied_clear(self, controller_id: str):
+        for controller in MockNetbootHandler.controllers:
+            if controller["controller_id"] == controller_id and "applied" in controller:
+                del controller["applied"]
+                self._bump_revision(controller_id)
 
     @logger_wrapper(logger)
     def list(self):
-        return [{"serial": k, "state": v} for k, v in MockNetbootHandler.devices.items()]
+        return [
+            dict({"serial": k, "state": v}, **MockNetbootHandler.inventory.get(k, {}))
+            for k, v in MockNetbootHandler.devices.items()
+        ]
 
     @logger_wrapper(logger)
     def revoke(self, serial):
@@ -50,6 +66,8 @@ class MockNetbootHandler(Handler, BaseMockHandler):
         if MockNetbootHandler.devices[serial] != "accepted":
             return False
         MockNetbootHandler.devices[serial] = "incoming"
+        MockNetbootHandler.inventory.pop(serial, None)
+        self._applied_clear(serial)
         return True
 
     @logger_wrapper(logger)
@@ -63,12 +81,80 @@ class MockNetbootHandler(Handler, BaseMockHandler):
             notify({"task_id": task_id, "status": "failed", "serial": serial})
         else:
             MockNetbootHandler.devices[serial] = "accepted"
-            notify({"task_id": task_id, "status": "succeeded", "serial": serial})
+            MockNetbootHandler.inventory[serial] = {
+                "ip": "192.168.15.%d" % (len(MockNetbootHandler.inventory) + 2),
+                "mac": "d8:58:d7:00:b3:62",
+            }
+            self._applied_clear(serial)
+            notify(
+                dict(
+                    {"task_id": task_id, "status": "succeeded", "serial": serial},
+                    controller_id=serial,
+                    **MockNetbootHandler.inventory[serial],
+                )
+            )
         return task_id
 
     @logger_wrapper(logger)
-    def commands_list(self) -> typing.List[dict]:
-        return MockNetbootHandler.controllers
+    def accept_batch(
+        self,
+        serials: typing.List[str],
+        notify: callable,
+        notify_batch: callable,
+        reset_notifications: callable,
+    ) -> typing.Tuple[str, typing.List[typing.Tuple[str, str]]]:
+        batch_id = "%08X" % random.randrange(2 ** 32)
+        tasks = []
+        results = []
+        for serial in dict.fromkeys(serials):
+            statuses = []
+
+            def notify_job(msg: dict, statuses=statuses):
+                statuses.append(msg["status"])
+                notify(msg)
+
+            task_id = self.accept(serial, notify_job, reset_notifications)
+            tasks.append((serial, task_id))
+            results.append({"serial": serial, "task_id": task_id, "status": statuses[-1]})
+        notify_batch({"task_id": batch_id, "results": results})
+        return batch_id, tasks
+
+    @logger_wrapper(logger)
+    def cancel_accept(self, task_id: str) -> bool:
+        # accepts are finished immediately here
+        return False
+
+    @logger_wrapper(logger)
+    def accept_stats(self) -> typing.List[dict]:
+        return [
+            {"stage": "ca_ready", "count": 1, "p50_ms": 1500.0, "p95_ms": 1500.0, "max_ms": 1500.0}
+        ]
+
+    @logger_wrapper(logger)
+    def commands_list(
+        self,
+        controller_ids: typing.Optional[typing.List[str]] = None,
+        include_logs: bool = True,
+        if_revision: typing.Optional[int] = None,
+    ) -> typing.Tuple[int, typing.Optional[typing.List[dict]]]:
+        if if_revision is not None and if_revision == MockNetbootHandler.revision:
+            return MockNetbootHandler.revision, None
+
+        res = []
+        for controller in MockNetbootHandler.controllers:
+            if controller_ids is not None and controller["controller_id"] not in controller_ids:
+                continue
+            record = {
+                "controller_id": controller["controller_id"],
+                "commands": controller["commands"],
+                "revision": MockNetbootHandler.revisions.get(controller["controller_id"], 0),
+            }
+            if "applied" in controller:
+                record["applied"] = controller["applied"]
+            if include_logs:
+                record["logs"] = controller["logs"]
+            res.append(record)
+        return MockNetbootHandler.revision, res
 
     @logger_wrapper(logger)
     def command_set(
@@ -98,11 +184,12 @@ class MockNetbootHandler(Handler, BaseMockHandler):
             controller_record["commands"].append(command_record)
 
         # update command
-        if "data" in command:
-            command_record["data"] = command["data"]
-        else:
-            if "data" in command_record:
-                del command_record["data"]
+        for field in ("data", "timeout_ms", "retries", "priority", "after"):
+            if field in command:
+                command_record[field] = command[field]
+            else:
+                if field in command_record:
+                    del command_record[field]
 
         from foris_controller.app import app_info
 
@@ -113,8 +200,15 @@ class MockNetbootHandler(Handler, BaseMockHandler):
             command_record["module_version"] = "?"
         command_record["stored_time"] = datetime.utcnow().isoformat()
 
+        self._bump_revision(controller_id)
         return command_record["module_version"], command_record["stored_time"]
 
+    @logger_wrapper(logger)
+    def command_set_bulk(
+        self, commands: typing.List[dict]
+    ) -> typing.List[typing.Optional[typing.Tuple[str, str]]]:
+        return [self.command_set(e["controller_id"], e["command"]) for e in commands]
+
     @logger_wrapper(logger)
     def command_unset(self, controller_id: str, module: str, action: str) -> bool:
         if not MockNetbootHandler.devices.get(controller_id) == "accepted":
@@ -142,12 +236,17 @@ class MockNetbootHandler(Handler, BaseMockHandler):
             if not (e["module"] == module and e["action"] == action)
         ]
 
+        self._bump_revision(controller_id)
         return True
 
+    @logger_wrapper(logger)
+    def command_unset_bulk(self, commands: typing.List[dict]) -> typing.List[bool]:
+        return [self.command_unset(e["controller_id"], e["module"], e["action"]) for e in commands]
+
     @logger_wrapper(logger)
     def command_log(
         self, controller_id: str, batch_id: str, record: dict
-    ) -> typing.Optional[typing.Tuple[str, str]]:
+    ) -> typing.Optional[str]:
         if not MockNetbootHandler.devices.get(controller_id) == "accepted":
             return None
 
@@ -185,4 +284,28 @@ class MockNetbootHandler(Handler, BaseMockHandler):
                 "when_stored": stored_time,
             }
         )
+        if "attempts" in record:
+            batch_records["records"][-1]["attempts"] = record["attempts"]
+        self._bump_revision(controller_id)
         return stored_time
+
+    @logger_wrapper(logger)
+    def command_log_batch(
+        self, controller_id: str, batch_id: str, records: typing.List[dict]
+    ) -> typing.List[typing.Optional[str]]:
+        return [self.command_log(controller_id, batch_id, e) for e in records]
+
+    @logger_wrapper(logger)
+    def applied_set(self, controller_id: str, fingerprints: typing.Dict[str, str]) -> bool:
+        if not MockNetbootHandler.devices.get(controller_id) == "accepted":
+            return False
+
+        controllers = [
+            e for e in MockNetbootHandler.controllers if e["controller_id"] == controller_id
+        ]
+        if len(controllers) != 1:
+            return False
+
+        controllers[0]["applied"] = fingerprints
+        self._bump_revision(controller_id)
+        return True
@@ -23,7 +23,14 @@ import typing
 from foris_controller.handler_base import BaseOpenwrtHandler
 from foris_controller.utils import logger_wrapper
 
-from foris_controller_backends.netboot import NetbootCmds, NetbootAsync, NetbootFiles
+from foris_controller_backends.netboot import (
+    NetbootCmds,
+    NetbootAsync,
+    NetbootAcceptQueue,
+    NetbootDeviceRegistry,
+    NetbootInventory,
+    create_storage,
+)
 
 from .. import Handler
 
@@ -34,28 +41,90 @@ class OpenwrtNetbootHandler(Handler, BaseOpenwrtHandler):
 
     cmds = NetbootCmds()
     async_cmds = NetbootAsync()
-    files = NetbootFiles()
+    accept_queue = NetbootAcceptQueue(cmds, async_cmds)
+    files = create_storage()
+    devices = NetbootDeviceRegistry(cmds)
+    inventory = NetbootInventory()
 
     def _netboot_serial_exists(self, serial):
-        return serial in [
-            e["serial"] for e in OpenwrtNetbootHandler.cmds.list() if e["state"] == "accepted"
-        ]
+        return OpenwrtNetbootHandler.devices.state(serial) == "accepted"
 
     @logger_wrapper(logger)
     def list(self):
-        return OpenwrtNetbootHandler.cmds.list()
+        # always obtain fresh list here (it also warms up the registry)
+        devices = OpenwrtNetbootHandler.devices.list(refresh=True)
+        inventory = OpenwrtNetbootHandler.inventory.get_all()
+        return [
+            dict(e, **inventory[e["serial"]])
+            if e["state"] == "accepted" and e["serial"] in inventory
+            else e
+            for e in devices
+        ]
 
     @logger_wrapper(logger)
     def revoke(self, serial: str):
-        return OpenwrtNetbootHandler.cmds.revoke(serial)
+        try:
+            res = OpenwrtNetbootHandler.cmds.revoke(serial)
+            if res:
+                OpenwrtNetbootHandler.inventory.remove(serial)
+                # device can be wiped, all commands have to be sent again
+                OpenwrtNetbootHandler.files.applied_clear(serial)
+            return res
+        finally:
+            OpenwrtNetbootHandler.devices.invalidate()
+
+    def _accept_notify(self, notify: callable) -> callable:
+        """ device states and addresses are changed when accept finishes """
+
+        def accept_notify(msg: dict):
+            if msg["status"] == "succeeded":
+                if "ip" in msg:
+                    OpenwrtNetbootHandler.inventory.store(
+                        msg["serial"], {k: msg[k] for k in ("ip", "mac") if k in msg}
+                    )
+                # newly accepted device has none of the commands applied
+                OpenwrtNetbootHandler.files.applied_clear(msg["serial"])
+            if msg["status"] in NetbootAcceptQueue.FINAL_STATUSES:
+                OpenwrtNetbootHandler.devices.invalidate()
+            notify(msg)
+
+        OpenwrtNetbootHandler.devices.invalidate()
+        return accept_notify
 
     @logger_wrapper(logger)
     def accept(self, serial: str, notify: callable, reset_notifications: callable):
-        return OpenwrtNetbootHandler.async_cmds.accept(serial, notify, reset_notifications)
+        return OpenwrtNetbootHandler.accept_queue.submit(
+            serial, self._accept_notify(notify), reset_notifications
+        )
+
+    @logger_wrapper(logger)
+    def accept_batch(
+        self,
+        serials: typing.List[str],
+        notify: callable,
+        notify_batch: callable,
+        reset_notifications: callable,
+    ) -> typing.Tuple[str, typing.List[typing.Tuple[str, str]]]:
+        return OpenwrtNetbootHandler.accept_queue.submit_batch(
+            serials, self._accept_notify(notify), notify_batch, reset_notifications
+        )
+
+    @logger_wrapper(logger)
+    def cancel_accept(self, task_id: str) -> bool:
+        return OpenwrtNetbootHandler.accept_queue.cancel(task_id)
 
     @logger_wrapper(logger)
-    def commands_list(self) -> typing.List[dict]:
-        return OpenwrtNetbootHandler.files.commands_list()
+    def accept_stats(self) -> typing.List[dict]:
+        return OpenwrtNetbootHandler.async_cmds.stats.summary()
+
+    @logger_wrapper(logger)
+    def commands_list(
+        self,
+        controller_ids: typing.Optional[typing.List[str]] = None,
+        include_logs: bool = True,
+        if_revision: typing.Optional[int] = None,
+    ) -> typing.Tuple[int, typing.Optional[typing.List[dict]]]:
+        return OpenwrtNetbootHandler.files.commands_list(controller_ids, include_logs, if_revision)
 
     @logger_wrapper(logger)
     def command_set(
@@ -65,6 +134,21 @@ class OpenwrtNetbootHandler(Handler, BaseOpenwrtHandler):
             return None
         return OpenwrtNetbootHandler.files.command_set(controller_id, command)
 
+    def _accepted_serials(self) -> typing.Set[str]:
+        return {
+            e["serial"] for e in OpenwrtNetbootHandler.devices.list() if e["state"] == "accepted"
+        }
+
+    @logger_wrapper(logger)
+    def command_set_bulk(
+        self, commands: typing.List[dict]
+    ) -> typing.List[typing.Optional[typing.Tuple[str, str]]]:
+        accepted = self._accepted_serials()
+        mask = [e["controller_id"] in accepted for e in commands]
+        valid = [e for e, m in zip(commands, mask) if m]
+        stored = iter(OpenwrtNetbootHandler.files.command_set_bulk(valid) if valid else [])
+        return [next(stored) if m else None for m in mask]
+
     @logger_wrapper(logger)
     def command_unset(self, controller_id: str, module: str, action: str) -> bool:
         if not self._netboot_serial_exists(controller_id):
@@ -74,7 +158,29 @@ class OpenwrtNetbootHandler(Handler, BaseOpenwrtHandler):
     @logger_wrapper(logger)
     def command_log(
         self, controller_id: str, batch_id, record: dict
-    ) -> typing.Optional[typing.Tuple[str, str]]:
+    ) -> typing.Optional[str]:
         if not self._netboot_serial_exists(controller_id):
             return None
         return OpenwrtNetbootHandler.files.command_log(controller_id, batch_id, record)
+
+    @logger_wrapper(logger)
+    def command_unset_bulk(self, commands: typing.List[dict]) -> typing.List[bool]:
+        accepted = self._accepted_serials()
+        mask = [e["controller_id"] in accepted for e in commands]
+        valid = [e for e, m in zip(commands, mask) if m]
+        unset = iter(OpenwrtNetbootHandler.files.command_unset_bulk(valid) if valid else [])
+        return [next(unset) if m else False for m in mask]
+
+    @logger_wrapper(logger)
+    def command_log_batch(
+        self, controller_id: str, batch_id: str, records: typing.List[dict]
+    ) -> typing.List[typing.Optional[str]]:
+        if not self._netboot_serial_exists(controller_id):
+            return [None] * len(records)
+        return OpenwrtNetbootHandler.files.command_log_batch(controller_id, batch_id, records)
+
+    @logger_wrapper(logger)
+    def applied_set(self, controller_id: str, fingerprints: typing.Dict[str, str]) -> bool:
+        if not self._netboot_serial_exists(controller_id):
+            return False
+        return OpenwrtNetbootHandler.files.applied_set(controller_id, fingerprints)
@@ -18,26 +18,46 @@
 #
 
 import argparse
+import concurrent.futures
 import logging
 import re
 import sys
-import uuid
+import threading
 import time
+import uuid
 import typing
 
 from foris_controller_netboot_module import __version__
 from foris_controller.utils import read_passwd_file
 
+from .cache import CommandsCache
+from .checkers import CheckerError, load_checkers
+from .commands import (
+    LOG_BATCH_SIZE,
+    TIMEOUT,
+    changed_commands,
+    check_result,
+    command_key,
+    log_record,
+    register_checkers,
+    retry_delay,
+)
+from .ingress import CoalescingQueue
+from .pool import WorkerPool
+from .retry import RetryTracker
+from .schedule import run_commands
+from .senders import SenderPool
+
 logger = logging.getLogger(__file__)
 
-TIMEOUT: int = 5000  # in ms
 LOGGER_MAX_LEN = 10000
 MIN_SETUP_RETRY = 30.0  # in secods
-
-
-CHECK_RESULTS: typing.Dict[str, typing.Callable[[dict], bool]] = {
-    "default": lambda data: True if data == {"result": True} else False
-}
+MAX_SETUP_RETRY = 3600.0  # in seconds (backoff after failed runs)
+RETRY_SIZE = 4096  # max number of tracked devices
+RETRY_TTL = 24 * 3600.0  # in seconds
+WORKERS = 4
+COMMAND_CONCURRENCY = 4  # commands sent to a single device at once
+INGRESS_SIZE = 1024
 
 
 def main():
@@ -52,6 +72,46 @@ def main():
     )
     parser.add_argument("--host", dest="host", default="localhost")
     parser.add_argument("--port", dest="port", type=int, default=1883)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKERS,
+        help="number of devices which are provisioned in parallel",
+    )
+    parser.add_argument(
+        "--command-concurrency",
+        type=int,
+        default=COMMAND_CONCURRENCY,
+        help="max number of independent commands sent to a device at once",
+    )
+    parser.add_argument(
+        "--full-replay",
+        action="store_true",
+        default=False,
+        help="always send all commands (even those which were already applied)",
+    )
+    parser.add_argument(
+        "--ingress-size",
+        type=int,
+        default=INGRESS_SIZE,
+        help="max number of devices waiting for provisioning",
+    )
+    parser.add_argument(
+        "--retry-file",
+        default=None,
+        help="file where the times of the last runs are stored (to survive restarts)",
+    )
+    parser.add_argument(
+        "--checkers-file",
+        default=None,
+        help="JSON file with result checkers of the commands ({\"module.action\": checker})",
+    )
+    parser.add_argument(
+        "--asyncio",
+        action="store_true",
+        default=False,
+        help="use asyncio engine (all requests share a single connection)",
+    )
     parser.add_argument(
         "--passwd-file",
         type=lambda x: read_passwd_file(x),
@@ -72,100 +132,230 @@ def main():
     try:
         from foris_client.buses import mqtt
         from foris_client.buses.base import prepare_controller_id, ControllerError
+        from .notifications import NotificationListener
     except ImportError:
         logger.error("Failed to import foris_client.")
         sys.exit(0)
 
+    try:
+        register_checkers(load_checkers(options.checkers_file))
+    except CheckerError as e:
+        logger.error("%s", e)
+        sys.exit(1)
+
     host_controller_id = prepare_controller_id(options.controller_id)
+    retry = RetryTracker(
+        MIN_SETUP_RETRY, MAX_SETUP_RETRY, RETRY_SIZE, RETRY_TTL, options.retry_file
+    )
+
+    if options.asyncio:
+        from .aio import run
+
+        run(options, host_controller_id, retry)
+        return
 
-    # instanticate sender
-    sender = mqtt.MqttSender(
-        options.host, options.port, TIMEOUT, credentials=options.passwd_file  # fixed timeout in ms
+    # senders are shared by the worker and command threads (grouped by timeout), the number of
+    # idle senders is capped so that per-command timeouts don't multiply the MQTT connections
+    senders = SenderPool(
+        lambda timeout: mqtt.MqttSender(
+            options.host,
+            options.port,
+            timeout,  # in ms
+            credentials=options.passwd_file,
+        ),
+        options.workers * (options.command_concurrency + 1),
     )
 
-    last_used: typing.Dict[str, float] = {}
+    def send_command(command: dict, controller_id: str) -> typing.Tuple[bool, int]:
+        """ Sends the command (retried with capped exponential backoff when it fails)
+
+        :returns: result and number of attempts
+        """
+        timeout = command.get("timeout_ms", TIMEOUT)
+        attempts = command.get("retries", 0) + 1
+        for attempt in range(1, attempts + 1):
+            if attempt > 1:
+                time.sleep(retry_delay(attempt))
+                logger.debug(
+                    "Retrying %s (attempt %d, %s)", command_key(command), attempt, controller_id
+                )
+            try:
+                with senders.get(timeout) as sender:
+                    command_resp = sender.send(
+                        command["module"],
+                        command["action"],
+                        command.get("data"),
+                        controller_id=controller_id,
+                    )
+                if check_result(command, command_resp):
+                    return True, attempt
+            except ControllerError:
+                logger.debug("Command %s failed (%s)", command_key(command), controller_id)
+        return False, attempts
+
+    commands_cache = CommandsCache()
+    ingress = CoalescingQueue(options.ingress_size)
+    pool = WorkerPool(options.workers, "provision")
+    # shared by all workers
+    command_executor = concurrent.futures.ThreadPoolExecutor(
+        options.workers * options.command_concurrency, thread_name_prefix="command"
+    )
 
     def listen_handler(data, controller_id):
-        try:
-            logger.debug(f"Notification from {controller_id} {data['module']}.{data['action']}")
-            if controller_id == host_controller_id:
-                logger.debug("Skip host notifications (%s)", controller_id)
-                return
+        logger.debug(f"Notification from {controller_id} {data['module']}.{data['action']}")
+        if controller_id == host_controller_id:
+            logger.debug("Skip host notifications (%s)", controller_id)
+            return
 
-            if data["module"] != "remove" and data["action"] != "advertize":
-                logger.debug("Other notification.")
-                return
+        if data["module"] != "remote" or data["action"] != "advertize":
+            logger.debug("Other notification.")
+            return
 
-            if data["data"]["netboot"] != "booted":
-                logger.debug("Not under netboot or already configured (%s)", controller_id)
-                return
+        if data["data"].get("netboot") != "booted":
+            logger.debug("Not under netboot or already configured (%s)", controller_id)
+            return
+
+        # only the latest advertisement of each controller is kept
+        ingress.put(controller_id, data)
+        logger.debug("Ingress %s", ingress.stats())
 
+    # a device is taken from the ingress only when a worker is free
+    # so that the waiting devices are coalesced (or dropped) in the bounded ingress
+    free_workers = threading.Semaphore(options.workers)
+    in_progress: typing.Set[str] = set()
+    in_progress_lock = threading.Lock()
+
+    def run_provision(controller_id: str):
+        try:
             # don't try to setup up to the same controller to recently
-            # wait at least MIN_SETUP_RETRY before retry
-            last_used_time: float = last_used.get(controller_id, 0.0)
-            if time.time() - last_used_time < MIN_SETUP_RETRY:
+            # wait at least MIN_SETUP_RETRY before retry (longer after failures)
+            if not retry.start(controller_id):
                 logger.debug("Was configured to recently (%s)", controller_id)
                 return
-            last_used[controller_id] = time.time()
+            logger.debug("Retry tracker %s", retry.stats())
+            try:
+                result = provision(controller_id)
+            except Exception:
+                # e.g. failed connection, the run has to be finished in the retry tracker
+                logger.exception("Netbooted device configuration failed (%s)", controller_id)
+                result = False
+            retry.finished(controller_id, result)
+        finally:
+            with in_progress_lock:
+                in_progress.discard(controller_id)
+            free_workers.release()
 
+    def dispatch():
+        while True:
+            free_workers.acquire()
+            controller_id, _ = ingress.get()
+            with in_progress_lock:
+                if controller_id in in_progress:
+                    logger.debug("Is being configured (%s)", controller_id)
+                    free_workers.release()
+                    continue
+                in_progress.add(controller_id)
+
+            pool.submit(
+                controller_id, lambda controller_id=controller_id: run_provision(controller_id)
+            )
+
+    def fetch_commands() -> typing.List[dict]:
+        with senders.get(TIMEOUT) as sender:
+            resp = sender.send(
+                "netboot",
+                "commands_list",
+                {"include_logs": False},
+                controller_id=host_controller_id,
+            )
+        return resp["controllers"]
+
+    def warm_commands_cache():
+        try:
+            commands_cache.get(host_controller_id, fetch_commands)
+        except (ControllerError, KeyError):
+            logger.warning("Failed to obtain commands from host.")
+
+    def notifications_connected():
+        # notifications might have been missed while disconnected
+        commands_cache.invalidate()
+        threading.Thread(target=warm_commands_cache, name="warm", daemon=True).start()
+
+    def provision(controller_id: str) -> bool:
+        """ :returns: True when all commands succeeded """
+        with senders.get(TIMEOUT) as sender:
+            return provision_with_sender(controller_id, sender)
+
+    def provision_with_sender(controller_id: str, sender: mqtt.MqttSender) -> bool:
+        try:
             # Get commands for particular controller id
-            resp = sender.send("netboot", "commands_list", None, controller_id=host_controller_id)
-            if "error" in resp:
+            try:
+                controller = commands_cache.get(controller_id, fetch_commands)
+            except KeyError:
                 logger.warning("Error occured.")
-                return
+                return False
 
-            # find controller_id
-            controllers = [e for e in resp["controllers"] if e["controller_id"] == controller_id]
-            if len(controllers) == 0 or len(controllers[0]["commands"]) == 0:
+            if len(controller["commands"]) == 0:
                 logger.debug("No commands ('%s')", controller_id)
                 # nothing to configure, mark as configured and exit
                 sender.send("remote", "set_netboot_configured", None, controller_id=controller_id)
-                return
+                return True
+
+            # send only commands which were changed since the last successful run
+            commands, fingerprints, new_applied = changed_commands(controller, options.full_replay)
+            logger.debug(
+                "Sending %d of %d commands (%s)", len(commands), len(fingerprints), controller_id
+            )
 
-            commands = controllers[0]["commands"]
             batch_id = str(uuid.uuid4())
 
-            def log_command(command: dict, result: bool):
-                logger.debug("Logging '%s.%s'", command["module"], command["action"])
+            log_records: typing.List[dict] = []
+            results: typing.List[bool] = []
+
+            def flush_log():
+                if not log_records:
+                    return
+                logger.debug("Logging %d records (%s)", len(log_records), controller_id)
                 sender.send(
                     "netboot",
-                    "command_log",
-                    {
-                        "controller_id": controller_id,
-                        "batch_id": batch_id,
-                        "record": {
-                            "module": command["module"],
-                            "action": command["action"],
-                            "result": result,
-                        },
-                    },
+                    "command_log_batch",
+                    {"controller_id": controller_id, "batch_id": batch_id, "records": log_records},
                     controller_id=host_controller_id,
                 )
-                logger.debug("Logged '%s.%s'", command["module"], command["action"])
+                log_records.clear()
 
-            for command in commands:
-                try:
-                    command_resp = sender.send(
-                        command["module"],
-                        command["action"],
-                        command.get("data"),
-                        controller_id=controller_id,
-                    )
-                    checker = CHECK_RESULTS.get(
-                        f"{command['module']}.{command['action']}", CHECK_RESULTS["default"]
-                    )
-                    result = checker(command_resp)
-                    log_command(command, result)
-                except ControllerError:
-                    log_command(command, False)
+            def log_command(command: dict, result: bool, attempts: int):
+                log_records.append(log_record(command, result, attempts))
+                results.append(result)
+                if result:
+                    new_applied[command_key(command)] = fingerprints[command_key(command)]
+                if len(log_records) >= LOG_BATCH_SIZE:
+                    flush_log()
+
+            # commands with ordering metadata can be sent concurrently
+            for command, (result, attempts) in run_commands(
+                commands,
+                lambda command: send_command(command, controller_id),
+                command_executor,
+                options.command_concurrency,
+            ):
+                log_command(command, result, attempts)
+            flush_log()
+
+            if new_applied != controller["applied"]:
+                applied = {"controller_id": controller_id, "fingerprints": new_applied}
+                sender.send("netboot", "applied_set", applied, controller_id=host_controller_id)
+                commands_cache.notification("applied_set", applied)
 
             # set configured
             sender.send("remote", "set_netboot_configured", None, controller_id=controller_id)
+            return all(results)
         except ControllerError as e:
             logger.error("Netbooted device configuration failed at some point.")
             logger.error(str(e))
             logger.debug("%s", e.errors[0]["description"])
             logger.debug("%s", e.errors[0]["stacktrace"])
+            return False
 
     listener = mqtt.MqttListener(
         options.host,
@@ -178,6 +368,18 @@ def main():
         credentials=options.passwd_file,
     )
 
+    # keep commands cache up to date
+    NotificationListener(
+        options.host,
+        options.port,
+        options.passwd_file,
+        host_controller_id,
+        "netboot",
+        commands_cache.notification,
+        notifications_connected,
+    ).start()
+
+    threading.Thread(target=dispatch, name="dispatch", daemon=True).start()
     listener.listen()
 
 
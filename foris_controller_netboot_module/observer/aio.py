@@ -0,0 +1,395 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+""" asyncio based observer engine
+
+All requests share a single MQTT connection and replies are matched to the requests
+by their reply_msg_id, so a pending request costs a future instead of a thread.
+"""
+
+import asyncio
+import collections
+import json
+import logging
+import signal
+import threading
+import typing
+import uuid
+
+from paho.mqtt import client as mqtt
+
+from .commands import (
+    LOG_BATCH_SIZE,
+    TIMEOUT,
+    changed_commands,
+    check_result,
+    command_key,
+    log_record,
+    retry_delay,
+)
+from .notifications import create_client
+from .retry import RetryTracker
+from .schedule import run_commands_async
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_TIMEOUT = 10.0  # in seconds (running provisioning is cancelled afterwards)
+
+
+class RequestError(Exception):
+    """ Error reply or no reply at all """
+
+
+class AsyncMqttClient(object):
+    """ Non-blocking request/reply over MQTT
+
+    paho network loop runs in its own thread, results are passed to the event loop.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        host: str,
+        port: int,
+        credentials: typing.Optional[typing.Tuple[str, str]],
+    ):
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.replies: typing.Dict[str, asyncio.Future] = {}  # reply topic -> future
+        self.subscribing: typing.Dict[int, asyncio.Future] = {}  # mid -> future
+        self.listeners: typing.Dict[str, typing.Callable[[str, dict], None]] = {}
+        self.connected = asyncio.Event()
+        self.client = create_client(host, port, credentials)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_subscribe = self._on_subscribe
+        self.client.on_message = self._on_message
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: typing.Any):
+        if not future.done():
+            future.set_result(result)
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            logger.warning("Failed to connect to message bus (%d)", rc)
+            return
+        for topic in self.listeners:
+            logger.debug("Subscribing to '%s'", topic)
+            client.subscribe(topic)
+        self.loop.call_soon_threadsafe(self.connected.set)
+
+    def _on_disconnect(self, client, userdata, rc):
+        logger.debug("Disconnected from message bus (%d)", rc)
+        self.loop.call_soon_threadsafe(self.connected.clear)
+
+    def _on_subscribe(self, client, userdata, mid, granted_qos):
+        with self.lock:
+            future = self.subscribing.pop(mid, None)
+        if future:
+            self.loop.call_soon_threadsafe(self._resolve, future, None)
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            parsed = json.loads(msg.payload)
+        except ValueError:
+            logger.warning("Failed to parse message from '%s'", msg.topic)
+            return
+
+        with self.lock:
+            future = self.replies.get(msg.topic)
+        if future:
+            self.loop.call_soon_threadsafe(self._resolve, future, parsed)
+            return
+
+        for topic, handler in self.listeners.items():
+            if mqtt.topic_matches_sub(topic, msg.topic):
+                self.loop.call_soon_threadsafe(handler, msg.topic, parsed)
+
+    def listen(self, topic: str, handler: typing.Callable[[str, dict], None]):
+        """ Calls handler(topic, message) for each message matching the topic (before start) """
+        self.listeners[topic] = handler
+
+    async def _subscribe(self, topic: str):
+        future = self.loop.create_future()
+        with self.lock:
+            rc, mid = self.client.subscribe(topic)
+            if rc != mqtt.MQTT_ERR_SUCCESS:
+                raise RequestError(f"Failed to subscribe to '{topic}' ({rc})")
+            self.subscribing[mid] = future
+        await future
+
+    async def request(
+        self,
+        controller_id: str,
+        module: str,
+        action: str,
+        data: typing.Optional[dict],
+        timeout_ms: int = TIMEOUT,
+    ) -> typing.Optional[dict]:
+        """ Sends request and waits for the reply (correlated by reply_msg_id)
+
+        :returns: data of the reply
+        """
+        msg_id = str(uuid.uuid4())
+        reply_topic = f"foris-controller/{controller_id}/reply/{msg_id}"
+        future = self.loop.create_future()
+        with self.lock:
+            self.replies[reply_topic] = future
+
+        async def exchange() -> dict:
+            await self.connected.wait()
+            await self._subscribe(reply_topic)
+            payload: typing.Dict[str, typing.Any] = {"reply_msg_id": msg_id}
+            if data is not None:
+                payload["data"] = data
+            self.client.publish(
+                f"foris-controller/{controller_id}/request/{module}/action/{action}",
+                json.dumps(payload),
+            )
+            return await future
+
+        try:
+            reply = await asyncio.wait_for(exchange(), timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            raise RequestError(f"{module}.{action} timed out ({controller_id})")
+        finally:
+            with self.lock:
+                del self.replies[reply_topic]
+            self.client.unsubscribe(reply_topic)
+
+        if "errors" in reply:
+            raise RequestError(f"{module}.{action} failed ({controller_id}): {reply['errors']}")
+        return reply.get("data")
+
+    def start(self):
+        self.client.loop_start()
+
+    def stop(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+class AsyncObserver(object):
+    def __init__(self, options, host_controller_id: str, retry: RetryTracker):
+        self.options = options
+        self.host_controller_id = host_controller_id
+        self.retry = retry
+        # only the latest advertisement of each controller is kept
+        self.pending: typing.OrderedDict[str, None] = collections.OrderedDict()
+        self.tasks: typing.Dict[str, asyncio.Task] = {}
+        self.stopping = False
+        self.wakeup = asyncio.Event()
+        self.workers = asyncio.Semaphore(options.workers)
+
+    def _advertized(self, topic: str, msg: dict):
+        controller_id = topic.split("/")[1]
+        logger.debug(f"Notification from {controller_id} {msg.get('module')}.{msg.get('action')}")
+        if controller_id == self.host_controller_id:
+            logger.debug("Skip host notifications (%s)", controller_id)
+            return
+
+        if msg.get("data", {}).get("netboot") != "booted":
+            logger.debug("Not under netboot or already configured (%s)", controller_id)
+            return
+
+        if controller_id not in self.pending and len(self.pending) >= self.options.ingress_size:
+            logger.debug("Queue full, dropping '%s'", controller_id)
+            return
+        self.pending[controller_id] = None
+        self.wakeup.set()
+
+    def _stop(self):
+        logger.debug("Stopping")
+        self.stopping = True
+        self.wakeup.set()
+
+    async def _dispatch(self):
+        """ Starts provisioning of the pending devices while there are free workers
+
+        A device is taken from the pending queue only when a worker is free
+        so that the waiting devices are coalesced (or dropped) in the bounded queue.
+        """
+        while self.pending and not self.workers.locked() and not self.stopping:
+            await self.workers.acquire()
+            controller_id, _ = self.pending.popitem(last=False)
+            if controller_id in self.tasks:
+                logger.debug("Is being configured (%s)", controller_id)
+                self.workers.release()
+                continue
+            self.tasks[controller_id] = asyncio.ensure_future(self._provision_task(controller_id))
+
+    async def _provision_task(self, controller_id: str):
+        try:
+            # don't try to setup up to the same controller to recently
+            # wait at least MIN_SETUP_RETRY before retry (longer after failures)
+            if not self.retry.start(controller_id):
+                logger.debug("Was configured to recently (%s)", controller_id)
+                return
+            logger.debug("Retry tracker %s", self.retry.stats())
+            self.retry.finished(controller_id, await self.provision(controller_id))
+        finally:
+            del self.tasks[controller_id]
+            self.workers.release()
+            self.wakeup.set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self._stop)
+
+        self.client = AsyncMqttClient(
+            loop, self.options.host, self.options.port, self.options.passwd_file
+        )
+        self.client.listen(
+            "foris-controller/+/notification/remote/action/advertize", self._advertized
+        )
+        self.client.start()
+
+        try:
+            while not self.stopping:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                await self._dispatch()
+        finally:
+            await self._shutdown()
+
+    async def _shutdown(self):
+        tasks = list(self.tasks.values())
+        if tasks:
+            logger.debug("Waiting for %d running provisioning", len(tasks))
+            _, running = await asyncio.wait(tasks, timeout=SHUTDOWN_TIMEOUT)
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+        self.client.stop()
+
+    async def send_command(self, command: dict, controller_id: str) -> typing.Tuple[bool, int]:
+        """ Sends the command (retried with capped exponential backoff when it fails)
+
+        :returns: result and number of attempts
+        """
+        attempts = command.get("retries", 0) + 1
+        for attempt in range(1, attempts + 1):
+            if attempt > 1:
+                await asyncio.sleep(retry_delay(attempt))
+                logger.debug(
+                    "Retrying %s (attempt %d, %s)", command_key(command), attempt, controller_id
+                )
+            try:
+                command_resp = await self.client.request(
+                    controller_id,
+                    command["module"],
+                    command["action"],
+                    command.get("data"),
+                    command.get("timeout_ms", TIMEOUT),
+                )
+                if check_result(command, command_resp):
+                    return True, attempt
+            except RequestError as e:
+                logger.debug("%s", e)
+        return False, attempts
+
+    async def provision(self, controller_id: str) -> bool:
+        """ :returns: True when all commands succeeded """
+        host_controller_id = self.host_controller_id
+        try:
+            # Get commands for particular controller id
+            resp = await self.client.request(
+                host_controller_id,
+                "netboot",
+                "commands_list",
+                {"controller_ids": [controller_id], "include_logs": False},
+            )
+            if len(resp["controllers"]) == 0:
+                # controllers without stored commands are not listed
+                controller = {"commands": [], "applied": {}}
+            else:
+                controller = {
+                    "commands": resp["controllers"][0]["commands"],
+                    "applied": resp["controllers"][0].get("applied", {}),
+                }
+
+            if len(controller["commands"]) == 0:
+                logger.debug("No commands ('%s')", controller_id)
+                # nothing to configure, mark as configured and exit
+                await self.client.request(controller_id, "remote", "set_netboot_configured", None)
+                return True
+
+            # send only commands which were changed since the last successful run
+            commands, fingerprints, new_applied = changed_commands(
+                controller, self.options.full_replay
+            )
+            logger.debug(
+                "Sending %d of %d commands (%s)", len(commands), len(fingerprints), controller_id
+            )
+
+            batch_id = str(uuid.uuid4())
+            log_records: typing.List[dict] = []
+            results: typing.List[bool] = []
+
+            async def flush_log():
+                if not log_records:
+                    return
+                logger.debug("Logging %d records (%s)", len(log_records), controller_id)
+                records = list(log_records)
+                log_records.clear()
+                await self.client.request(
+                    host_controller_id,
+                    "netboot",
+                    "command_log_batch",
+                    {"controller_id": controller_id, "batch_id": batch_id, "records": records},
+                )
+
+            async for command, (result, attempts) in run_commands_async(
+                commands,
+                lambda command: self.send_command(command, controller_id),
+                self.options.command_concurrency,
+            ):
+                log_records.append(log_record(command, result, attempts))
+                results.append(result)
+                if result:
+                    new_applied[command_key(command)] = fingerprints[command_key(command)]
+                if len(log_records) >= LOG_BATCH_SIZE:
+                    await flush_log()
+            await flush_log()
+
+            if new_applied != controller["applied"]:
+                applied = {"controller_id": controller_id, "fingerprints": new_applied}
+                await self.client.request(host_controller_id, "netboot", "applied_set", applied)
+
+            # set configured
+            await self.client.request(controller_id, "remote", "set_netboot_configured", None)
+            return all(results)
+        except RequestError as e:
+            logger.error("Netbooted device configuration failed at some point.")
+            logger.error(str(e))
+            return False
+        except Exception:
+            # e.g. unexpected reply format, the run has to be finished in the retry tracker
+            logger.exception("Netbooted device configuration failed (%s)", controller_id)
+            return False
+
+
+def run(options, host_controller_id: str, retry: RetryTracker):
+    async def main():
+        # created within the running loop (asyncio primitives are bound to it)
+        await AsyncObserver(options, host_controller_id, retry).run()
+
+    asyncio.run(main())
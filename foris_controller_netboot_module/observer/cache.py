@@ -0,0 +1,150 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import logging
+import threading
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+class CommandsCache(object):
+    """ Local copy of commands stored on the host (controller_id -> commands and applied)
+
+    It is filled by a full netboot.commands_list and patched in place
+    by netboot.command_set* / netboot.command_unset* / netboot.applied_set notifications.
+    Applied fingerprints are dropped when the device is revoked or accepted again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # only one fill runs at once, other callers wait for its result
+        self.fill_lock = threading.Lock()
+        self.controllers: typing.Optional[typing.Dict[str, dict]] = None
+        # notifications received while the cache is being filled
+        self.pending: typing.Optional[typing.List[typing.Tuple[str, dict]]] = None
+        # increased on invalidation, fill started before it is not stored
+        self.generation = 0
+
+    def invalidate(self):
+        with self.lock:
+            logger.debug("Commands cache invalidated")
+            self.controllers = None
+            self.generation += 1
+
+    def _controller(self, controller_id: str) -> dict:
+        controller = self.controllers.get(controller_id, {})
+        return {
+            "commands": list(controller.get("commands", [])),
+            "applied": dict(controller.get("applied", {})),
+        }
+
+    def get(self, controller_id: str, fetch: typing.Callable[[], typing.List[dict]]) -> dict:
+        """ Returns commands and applied fingerprints of the controller
+
+        fetch() is used to obtain all commands if needed
+
+        :param fetch: returns commands_list of all controllers
+        """
+        with self.lock:
+            if self.controllers is not None:
+                return self._controller(controller_id)
+
+        with self.fill_lock:
+            with self.lock:
+                # filled while waiting for the other fill
+                if self.controllers is not None:
+                    return self._controller(controller_id)
+                self.pending = []
+                generation = self.generation
+
+            try:
+                controllers = {
+                    e["controller_id"]: {
+                        "commands": e["commands"],
+                        "applied": e.get("applied", {}),
+                    }
+                    for e in fetch()
+                }
+            except Exception:
+                with self.lock:
+                    self.pending = None
+                raise
+
+            with self.lock:
+                self.controllers = controllers
+                for action, data in self.pending:
+                    self._apply(action, data)
+                self.pending = None
+                res = self._controller(controller_id)
+                if generation == self.generation:
+                    logger.debug("Commands cache filled (%d controllers)", len(controllers))
+                else:
+                    # notifications could have been missed, fill again next time
+                    logger.debug("Commands cache invalidated while being filled")
+                    self.controllers = None
+                return res
+
+    def _set(self, controller_id: str, command: dict):
+        controller = self.controllers.setdefault(controller_id, {"commands": [], "applied": {}})
+        commands = list(controller["commands"])
+        for idx, record in enumerate(commands):
+            if (record["module"], record["action"]) == (command["module"], command["action"]):
+                commands[idx] = command
+                break
+        else:
+            commands.append(command)
+        controller["commands"] = commands
+
+    def _unset(self, controller_id: str, module: str, action: str):
+        controller = self.controllers.setdefault(controller_id, {"commands": [], "applied": {}})
+        controller["commands"] = [
+            e for e in controller["commands"] if (e["module"], e["action"]) != (module, action)
+        ]
+
+    def _applied(self, controller_id: str, fingerprints: typing.Dict[str, str]):
+        controller = self.controllers.setdefault(controller_id, {"commands": [], "applied": {}})
+        controller["applied"] = fingerprints
+
+    def _applied_clear(self, controller_id: str):
+        if controller_id in self.controllers:
+            self.controllers[controller_id]["applied"] = {}
+
+    def _apply(self, action: str, data: dict):
+        if action == "command_set":
+            self._set(data["controller_id"], data["command"])
+        elif action == "command_set_bulk":
+            for item in data["commands"]:
+                self._set(item["controller_id"], item["command"])
+        elif action == "command_unset":
+            self._unset(data["controller_id"], data["module"], data["action"])
+        elif action == "command_unset_bulk":
+            for item in data["commands"]:
+                self._unset(item["controller_id"], item["module"], item["action"])
+        elif action == "applied_set":
+            self._applied(data["controller_id"], data["fingerprints"])
+        elif action == "revoke" or (action == "accept" and data.get("status") == "succeeded"):
+            self._applied_clear(data["serial"])
+
+    def notification(self, action: str, data: dict):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((action, data))
+            if self.controllers is not None:
+                self._apply(action, data)
@@ -0,0 +1,183 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+""" Result checkers of the commands
+
+Checkers are compiled once (at startup) into plain functions. A checker is either a callable
+or a spec:
+
+    {
+        "schema": {"type": "object", "required": ["result"]},  # JSON schema
+        "match": [{"path": "result", "value": true}],  # all predicates have to match
+    }
+
+Predicates are `{"path": "a.b.0", "value": ...}`, `{"path": ..., "in": [...]}`
+and `{"path": ..., "exists": true/false}`.
+
+Schemas are validated by jsonschema (optional, required only when a schema is used).
+
+Checkers are loaded from `foris_netboot_observer.checkers` entry points (name is `module.action`
+or `default`, object is a callable or a spec) and from a JSON file (`{"module.action": spec}`).
+"""
+
+import json
+import logging
+import typing
+
+from importlib import metadata
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "foris_netboot_observer.checkers"
+
+Checker = typing.Callable[[typing.Any], bool]
+
+_MISSING = object()
+
+
+class CheckerError(Exception):
+    pass
+
+
+def _equal(first: typing.Any, second: typing.Any) -> bool:
+    # True == 1 in python but not in JSON
+    return first == second and isinstance(first, bool) == isinstance(second, bool)
+
+
+def _all(checks: typing.List[Checker]) -> Checker:
+    if not checks:
+        return lambda data: True
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(data: typing.Any) -> bool:
+        for check in checks:
+            if not check(data):
+                return False
+        return True
+
+    return check_all
+
+
+def _compile_schema(schema: dict) -> Checker:
+    # optional dependency, needed only when a schema is used
+    try:
+        import jsonschema
+    except ImportError:
+        raise CheckerError("Schema checkers require jsonschema to be installed")
+
+    try:
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator_class.check_schema(schema)
+    except jsonschema.exceptions.SchemaError as e:
+        raise CheckerError(f"Invalid schema: {e.message}")
+    return validator_class(schema).is_valid
+
+
+def _compile_path(path: str) -> typing.Callable[[typing.Any], typing.Any]:
+    # (object key, list index)
+    keys = tuple((e, int(e) if e.isdigit() else None) for e in path.split(".")) if path else ()
+
+    def resolve(data: typing.Any) -> typing.Any:
+        for key, index in keys:
+            if isinstance(data, dict):
+                data = data.get(key, _MISSING)
+            elif isinstance(data, list) and index is not None and index < len(data):
+                data = data[index]
+            else:
+                return _MISSING
+        return data
+
+    return resolve
+
+
+def _compile_predicate(predicate: dict) -> Checker:
+    if not isinstance(predicate, dict) or not isinstance(predicate.get("path"), str):
+        raise CheckerError(f"Predicate has to contain a path '{predicate}'")
+    resolve = _compile_path(predicate["path"])
+
+    if "value" in predicate:
+        value = predicate["value"]
+        return lambda data: _equal(resolve(data), value)
+    if "in" in predicate:
+        values = predicate["in"]
+        return lambda data: any(_equal(resolve(data), e) for e in values)
+    if "exists" in predicate:
+        exists = bool(predicate["exists"])
+        return lambda data: (resolve(data) is not _MISSING) == exists
+    raise CheckerError(f"Predicate has to contain value, in or exists '{predicate}'")
+
+
+def compile_checker(spec: typing.Union[Checker, dict]) -> Checker:
+    if callable(spec):
+        return spec
+    if not isinstance(spec, dict) or not spec.keys() & {"schema", "match"}:
+        raise CheckerError(f"Checker has to contain schema or match '{spec}'")
+    unknown = spec.keys() - {"schema", "match"}
+    if unknown:
+        raise CheckerError(f"Unknown checker fields {sorted(unknown)}")
+
+    checks = []
+    if "schema" in spec:
+        checks.append(_compile_schema(spec["schema"]))
+    if "match" in spec:
+        predicates = spec["match"] if isinstance(spec["match"], list) else [spec["match"]]
+        checks.extend(_compile_predicate(e) for e in predicates)
+    return _all(checks)
+
+
+def _entry_points() -> typing.Iterable[metadata.EntryPoint]:
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        return entry_points.select(group=ENTRY_POINT_GROUP)
+    # python < 3.10
+    return entry_points.get(ENTRY_POINT_GROUP, [])
+
+
+def load_checkers(path: typing.Optional[str] = None) -> typing.Dict[str, Checker]:
+    """ Compiles checkers from entry points and from the file (file ones take precedence)
+
+    :returns: checkers by `module.action`
+    """
+    res: typing.Dict[str, Checker] = {}
+
+    for entry_point in _entry_points():
+        try:
+            res[entry_point.name] = compile_checker(entry_point.load())
+        except Exception as e:
+            logger.warning("Failed to load checker '%s': %s", entry_point.name, e)
+            continue
+        logger.debug("Checker '%s' loaded from '%s'", entry_point.name, entry_point.value)
+
+    if path:
+        try:
+            with open(path) as f:
+                specs = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CheckerError(f"Failed to read checkers from '{path}': {e}")
+        if not isinstance(specs, dict):
+            raise CheckerError(f"Checkers in '{path}' have to be an object")
+        for name, spec in specs.items():
+            try:
+                res[name] = compile_checker(spec)
+            except CheckerError as e:
+                raise CheckerError(f"Checker '{name}' in '{path}': {e}")
+        logger.debug("%d checkers loaded from '%s'", len(specs), path)
+
+    return res
@@ -0,0 +1,84 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+""" Handling of commands shared by the observer engines """
+
+import hashlib
+import json
+import typing
+
+TIMEOUT: int = 5000  # in ms (default, commands may set their own timeout_ms)
+RETRY_BACKOFF = 1.0  # in seconds, doubled after each failed attempt
+RETRY_BACKOFF_MAX = 30.0  # in seconds
+LOG_BATCH_SIZE = 20  # command results sent to host at once
+
+
+CHECK_RESULTS: typing.Dict[str, typing.Callable[[dict], bool]] = {
+    "default": lambda data: True if data == {"result": True} else False
+}
+
+
+def command_key(command: dict) -> str:
+    return f"{command['module']}.{command['action']}"
+
+
+def command_fingerprint(command: dict) -> str:
+    """ Identifies the stored version of the command """
+    content = json.dumps(
+        {k: command.get(k) for k in ("module", "action", "data", "stored_time")}, sort_keys=True
+    )
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def register_checkers(checkers: typing.Dict[str, typing.Callable[[dict], bool]]):
+    """ Adds compiled checkers (see checkers.load_checkers), `default` replaces the default one """
+    CHECK_RESULTS.update(checkers)
+
+
+def check_result(command: dict, response: dict) -> bool:
+    checker = CHECK_RESULTS.get(command_key(command)) or CHECK_RESULTS["default"]
+    return checker(response)
+
+
+def retry_delay(attempt: int) -> float:
+    """ Delay before the attempt (in seconds, attempts are numbered from 1) """
+    return min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** (attempt - 2))
+
+
+def log_record(command: dict, result: bool, attempts: int) -> dict:
+    return {
+        "module": command["module"],
+        "action": command["action"],
+        "result": result,
+        "attempts": attempts,
+    }
+
+
+def changed_commands(
+    controller: dict, full_replay: bool
+) -> typing.Tuple[typing.List[dict], typing.Dict[str, str], typing.Dict[str, str]]:
+    """ Selects commands which were changed since the last successful run
+
+    :returns: commands to send, fingerprints of all commands and fingerprints of applied commands
+    """
+    fingerprints = {command_key(e): command_fingerprint(e) for e in controller["commands"]}
+    applied = {} if full_replay else controller["applied"]
+    new_applied = {k: v for k, v in applied.items() if fingerprints.get(k) == v}
+    commands = [e for e in controller["commands"] if command_key(e) not in new_applied]
+    return commands, fingerprints, new_applied
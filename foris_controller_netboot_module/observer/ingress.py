@@ -0,0 +1,61 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import collections
+import logging
+import threading
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingQueue(object):
+    """ Bounded FIFO queue which keeps only the latest pending item per key
+
+    A new item for a key which is already waiting replaces the old one (and keeps its position).
+    New keys are dropped when the queue is full.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.condition = threading.Condition()
+        self.items: typing.OrderedDict[str, typing.Any] = collections.OrderedDict()
+        self.coalesced = 0
+        self.dropped = 0
+
+    def put(self, key: str, item: typing.Any) -> bool:
+        with self.condition:
+            if key in self.items:
+                self.coalesced += 1
+            elif len(self.items) >= self.max_size:
+                self.dropped += 1
+                logger.debug("Queue full, dropping '%s' (%s)", key, self.stats())
+                return False
+            self.items[key] = item
+            self.condition.notify()
+            return True
+
+    def get(self) -> typing.Tuple[str, typing.Any]:
+        with self.condition:
+            while not self.items:
+                self.condition.wait()
+            return self.items.popitem(last=False)
+
+    def stats(self) -> str:
+        return f"size={len(self.items)} coalesced={self.coalesced} dropped={self.dropped}"
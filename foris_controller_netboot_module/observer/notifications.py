@@ -0,0 +1,87 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import json
+import logging
+import typing
+
+from paho.mqtt import client as mqtt
+
+logger = logging.getLogger(__name__)
+
+
+def create_client(
+    host: str, port: int, credentials: typing.Optional[typing.Tuple[str, str]]
+) -> mqtt.Client:
+    try:
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+    except AttributeError:
+        # paho-mqtt < 2.0
+        client = mqtt.Client()
+    if credentials:
+        client.username_pw_set(*credentials)
+    client.connect_async(host, port, keepalive=30)
+    return client
+
+
+class NotificationListener(object):
+    """ Listens to notifications of a single module of a single controller
+
+    Unlike foris_client listener it runs in its own background thread
+    and reports every (re)connect so that the state derived from notifications can be refreshed.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        credentials: typing.Optional[typing.Tuple[str, str]],
+        controller_id: str,
+        module: str,
+        handler: typing.Callable[[str, dict], None],
+        connected: typing.Callable[[], None],
+    ):
+        self.topic = f"foris-controller/{controller_id}/notification/{module}/action/+"
+        self.handler = handler
+        self.connected = connected
+        self.client = create_client(host, port, credentials)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            logger.warning("Failed to connect to notifications (%d)", rc)
+            return
+        logger.debug("Subscribing to '%s'", self.topic)
+        client.subscribe(self.topic)
+        self.connected()
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            parsed = json.loads(msg.payload)
+            self.handler(parsed["action"], parsed.get("data", {}))
+        except (ValueError, KeyError):
+            logger.warning("Failed to process notification from '%s'", msg.topic)
+
+    def start(self):
+        self.client.loop_start()
+
+    def stop(self):
+        self.client.loop_stop()
+        self.client.disconnect()
@@ -0,0 +1,83 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import collections
+import logging
+import queue
+import threading
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool(object):
+    """ Bounded pool of worker threads
+
+    Work items submitted with the same key are processed one after another,
+    work items with different keys are processed in parallel.
+    """
+
+    def __init__(self, size: int, name: str = "worker"):
+        self.lock = threading.Lock()
+        self.ready: "queue.Queue[str]" = queue.Queue()
+        self.pending: typing.Dict[str, typing.Deque[typing.Callable[[], None]]] = {}
+        self.queued = 0
+        self.in_flight = 0
+
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            for i in range(size)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, key: str, func: typing.Callable[[], None]):
+        with self.lock:
+            if key in self.pending:
+                # key is already being processed or waiting, keep the order
+                self.pending[key].append(func)
+            else:
+                self.pending[key] = collections.deque([func])
+                self.ready.put(key)
+            self.queued += 1
+            logger.debug("Submitted '%s' (%s)", key, self._gauges())
+
+    def _gauges(self) -> str:
+        return f"queued={self.queued} in_flight={self.in_flight}"
+
+    def _worker(self):
+        while True:
+            key = self.ready.get()
+            with self.lock:
+                func = self.pending[key].popleft()
+                self.queued -= 1
+                self.in_flight += 1
+
+            try:
+                func()
+            except Exception:
+                logger.exception("Work item '%s' failed", key)
+
+            with self.lock:
+                self.in_flight -= 1
+                if self.pending[key]:
+                    self.ready.put(key)
+                else:
+                    del self.pending[key]
+                logger.debug("Finished '%s' (%s)", key, self._gauges())
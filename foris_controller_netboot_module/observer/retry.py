@@ -0,0 +1,131 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+class RetryTracker(object):
+    """ Decides when a device can be provisioned again
+
+    After a run the device waits `min_retry` seconds, after failed runs the delay
+    doubles up to `max_retry`. Only `max_size` least recently used devices are tracked
+    and devices which weren't seen for `ttl` seconds are forgotten.
+    """
+
+    def __init__(
+        self,
+        min_retry: float,
+        max_retry: float,
+        max_size: int,
+        ttl: float,
+        path: typing.Optional[str] = None,
+    ):
+        """
+        :param path: file where the state is persisted (not persisted when not set)
+        """
+        self.min_retry = min_retry
+        self.max_retry = max_retry
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.lock = threading.Lock()
+        # controller_id -> [last run start, consecutive failures]
+        self.entries: typing.OrderedDict[str, list] = collections.OrderedDict()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+            if not isinstance(entries, dict):
+                raise ValueError("Retry state is not an object")
+            for controller_id, entry in entries.items():
+                if not isinstance(entry, list) or len(entry) != 2:
+                    raise ValueError(f"Invalid retry entry of '{controller_id}'")
+                last_run, failures = entry
+                self.entries[controller_id] = [float(last_run), int(failures)]
+        except (OSError, ValueError, TypeError):
+            logger.warning("Failed to load retry state from '%s'", self.path)
+            self.entries.clear()
+        self._expire(time.time())
+
+    def _store(self):
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.rename(tmp_path, self.path)
+        except OSError:
+            logger.warning("Failed to store retry state to '%s'", self.path)
+
+    def _expire(self, now: float):
+        while self.entries:
+            controller_id, (last_run, _) = next(iter(self.entries.items()))
+            if now - last_run < self.ttl and len(self.entries) <= self.max_size:
+                break
+            del self.entries[controller_id]
+
+    def _delay(self, failures: int) -> float:
+        return min(self.max_retry, self.min_retry * 2 ** failures)
+
+    def start(self, controller_id: str) -> bool:
+        """ Marks the start of the run if the device can be provisioned now
+
+        :returns: False when the device was provisioned too recently
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(controller_id)
+            if entry and now - entry[0] < self._delay(entry[1]):
+                return False
+            self.entries[controller_id] = [now, entry[1] if entry else 0]
+            self.entries.move_to_end(controller_id)
+            self._expire(now)
+            self._store()
+        return True
+
+    def finished(self, controller_id: str, succeeded: bool):
+        with self.lock:
+            entry = self.entries.get(controller_id)
+            if not entry:
+                return
+            entry[1] = 0 if succeeded else entry[1] + 1
+            if not succeeded:
+                logger.debug(
+                    "Run failed %d times, next retry in %.0f s (%s)",
+                    entry[1],
+                    self._delay(entry[1]),
+                    controller_id,
+                )
+            self._store()
+
+    def stats(self) -> str:
+        return f"size={len(self.entries)}"
@@ -0,0 +1,140 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import asyncio
+import concurrent.futures
+import logging
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+def has_ordering(command: dict) -> bool:
+    return "priority" in command or "after" in command
+
+
+def command_dependencies(commands: typing.List[dict]) -> typing.List[typing.Set[int]]:
+    """ Computes indexes of commands which have to be finished before each command
+
+    * command without ordering metadata waits for all preceding commands (sequential)
+    * command with `after` waits for the listed commands (`module.action`)
+    * command with `priority` waits for all commands with a lower priority
+    """
+    indexes = {f"{e['module']}.{e['action']}": i for i, e in enumerate(commands)}
+    res = []
+    for i, command in enumerate(commands):
+        if not has_ordering(command):
+            res.append(set(range(i)))
+            continue
+
+        dependencies = {indexes[e] for e in command.get("after", []) if e in indexes}
+        if "priority" in command:
+            dependencies.update(
+                j
+                for j, other in enumerate(commands)
+                if other.get("priority", command["priority"]) < command["priority"]
+            )
+        dependencies.discard(i)
+        res.append(dependencies)
+    return res
+
+
+def run_commands(
+    commands: typing.List[dict],
+    send: typing.Callable[[dict], typing.Any],
+    executor: concurrent.futures.Executor,
+    limit: int,
+) -> typing.Iterator[typing.Tuple[dict, typing.Any]]:
+    """ Sends commands, independent commands are sent concurrently (at most `limit` at once)
+
+    :returns: (command, result of send) in the order in which the commands finished
+    """
+    if limit <= 1 or not any(has_ordering(e) for e in commands):
+        # plain sequential run in the current thread
+        for command in commands:
+            yield command, send(command)
+        return
+
+    dependencies = command_dependencies(commands)
+    waiting = list(range(len(commands)))
+    finished: typing.Set[int] = set()
+    running: typing.Dict[concurrent.futures.Future, int] = {}
+
+    while waiting or running:
+        ready = [i for i in waiting if dependencies[i] <= finished]
+        if not ready and not running:
+            # dependency cycle -> fallback to the original order
+            logger.warning("Commands dependency cycle detected, sending the rest sequentially")
+            ready = waiting[:1]
+        for i in ready[: limit - len(running)]:
+            waiting.remove(i)
+            running[executor.submit(send, commands[i])] = i
+
+        done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            i = running.pop(future)
+            finished.add(i)
+            yield commands[i], future.result()
+
+
+def _acyclic(dependencies: typing.List[typing.Set[int]]) -> bool:
+    remaining = {i: set(e) for i, e in enumerate(dependencies)}
+    while remaining:
+        ready = [i for i, e in remaining.items() if not e]
+        if not ready:
+            return False
+        for i in ready:
+            del remaining[i]
+        for e in remaining.values():
+            e.difference_update(ready)
+    return True
+
+
+async def run_commands_async(
+    commands: typing.List[dict],
+    send: typing.Callable[[dict], typing.Awaitable[typing.Any]],
+    limit: int,
+) -> typing.AsyncIterator[typing.Tuple[dict, typing.Any]]:
+    """ asyncio variant of run_commands
+
+    :returns: (command, result of send) in the order in which the commands finished
+    """
+    dependencies = command_dependencies(commands)
+    if not _acyclic(dependencies):
+        logger.warning("Commands dependency cycle detected, sending commands sequentially")
+        dependencies = [set(range(i)) for i in range(len(commands))]
+
+    finished = [asyncio.Event() for _ in commands]
+    semaphore = asyncio.Semaphore(max(limit, 1))
+
+    async def run(i: int) -> typing.Tuple[dict, typing.Any]:
+        for j in dependencies[i]:
+            await finished[j].wait()
+        async with semaphore:
+            result = await send(commands[i])
+        finished[i].set()
+        return commands[i], result
+
+    tasks = [asyncio.ensure_future(run(i)) for i in range(len(commands))]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
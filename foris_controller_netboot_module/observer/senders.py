@@ -0,0 +1,84 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import contextlib
+import logging
+import threading
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+class SenderPool(object):
+    """ Shared pool of senders grouped by timeout
+
+    A sender is used by a single thread at a time (it is checked out for the request).
+    Idle senders are reused by any thread which needs the same timeout, at most `max_idle`
+    of them are kept (the least recently used ones are disconnected).
+    """
+
+    def __init__(self, factory: typing.Callable[[int], typing.Any], max_idle: int):
+        """
+        :param factory: creates a sender with the given timeout (in ms)
+        """
+        self.factory = factory
+        self.max_idle = max_idle
+        self.lock = threading.Lock()
+        # (timeout, sender), the most recently returned last
+        self.idle: typing.List[typing.Tuple[int, typing.Any]] = []
+        self.busy = 0
+
+    @contextlib.contextmanager
+    def get(self, timeout: int):
+        sender = self._checkout(timeout)
+        try:
+            yield sender
+        finally:
+            self._release(timeout, sender)
+
+    def _checkout(self, timeout: int):
+        with self.lock:
+            self.busy += 1
+            for i in range(len(self.idle) - 1, -1, -1):
+                if self.idle[i][0] == timeout:
+                    return self.idle.pop(i)[1]
+        try:
+            logger.debug("New sender (timeout %d ms, %s)", timeout, self.stats())
+            return self.factory(timeout)
+        except Exception:
+            with self.lock:
+                self.busy -= 1
+            raise
+
+    def _release(self, timeout: int, sender):
+        with self.lock:
+            self.busy -= 1
+            self.idle.append((timeout, sender))
+            evicted = self.idle[: -self.max_idle] if self.max_idle > 0 else list(self.idle)
+            del self.idle[: len(evicted)]
+
+        for evicted_timeout, evicted_sender in evicted:
+            logger.debug("Disconnecting idle sender (timeout %d ms)", evicted_timeout)
+            try:
+                evicted_sender.disconnect()
+            except Exception:
+                logger.warning("Failed to disconnect sender", exc_info=True)
+
+    def stats(self) -> dict:
+        return {"idle": len(self.idle), "busy": self.busy}
@@ -20,6 +20,10 @@
 import pytest
 import os
 
+# accepts are started one by one so that the queue can be tested deterministically
+# (set before foris-controller is started by the infrastructure fixture)
+os.environ["FORIS_NETBOOT_ACCEPT_CONCURRENCY"] = "1"
+
 
 @pytest.fixture(scope="session")
 def uci_config_default_path():
@@ -0,0 +1,184 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import threading
+import time
+
+import pytest
+
+from foris_controller.app import app_info
+
+app_info["lock_backend"] = threading
+app_info.setdefault("modules", {})
+
+from foris_controller_backends import netboot  # noqa: E402
+from foris_controller_backends.netboot import (  # noqa: E402
+    NetbootAcceptQueue,
+    NetbootAcceptStats,
+    NetbootAsync,
+    NetbootTokenBucket,
+)
+
+COMMAND = ["/usr/bin/netboot-manager", "accept", "0000000D300002AF"]
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeAsync(object):
+    """ Records started accepts, they are finished by the test """
+
+    def __init__(self):
+        self.stats = NetbootAcceptStats()
+        self.notifies = {}
+
+    def accept(self, serial: str, notify: callable, reset_notifications: callable):
+        self.notifies[serial] = notify
+        notify({"task_id": "process", "status": "started", "serial": serial})
+
+    def finish(self, serial: str, status: str = "succeeded"):
+        self.notifies.pop(serial)({"task_id": "process", "status": status, "serial": serial})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(netboot.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket(clock):
+    bucket = NetbootTokenBucket(60, 2)  # one token per second
+    assert bucket.take() == 0.0
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert bucket.take() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.take() == 0.0
+
+    # tokens are refilled only up to the capacity
+    clock.now += 100
+    assert bucket.take() == 0.0
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(1.0)
+
+
+def test_token_bucket_limits(clock):
+    unlimited = NetbootTokenBucket(0, 0)
+    assert all(unlimited.take() == 0.0 for _ in range(100))
+
+    # at least one token can be taken
+    bucket = NetbootTokenBucket(30, 0)
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(2.0)
+
+
+@pytest.mark.parametrize(
+    "nice,ionice,cpus,cgroup,expected",
+    [
+        (None, None, None, None, COMMAND),
+        ("10", None, None, None, ["/usr/bin/nice", "-n", "10"] + COMMAND),
+        (None, "2:7", None, None, ["/usr/bin/ionice", "-c", "2", "-n", "7"] + COMMAND),
+        (None, "3", None, None, ["/usr/bin/ionice", "-c", "3"] + COMMAND),
+        (None, None, "1,2", None, ["/usr/bin/taskset", "-c", "1,2"] + COMMAND),
+        (
+            None,
+            None,
+            None,
+            "/sys/fs/cgroup/netboot",
+            ["/bin/sh", "-c", 'echo $$ > "$0/cgroup.procs" && exec "$@"', "/sys/fs/cgroup/netboot"]
+            + COMMAND,
+        ),
+        (
+            "10",
+            "3",
+            "1",
+            "/sys/fs/cgroup/netboot",
+            [
+                "/bin/sh",
+                "-c",
+                'echo $$ > "$0/cgroup.procs" && exec "$@"',
+                "/sys/fs/cgroup/netboot",
+                "/usr/bin/taskset",
+                "-c",
+                "1",
+                "/usr/bin/ionice",
+                "-c",
+                "3",
+                "/usr/bin/nice",
+                "-n",
+                "10",
+            ]
+            + COMMAND,
+        ),
+    ],
+)
+def test_scheduled(monkeypatch, nice, ionice, cpus, cgroup, expected):
+    monkeypatch.setattr(NetbootAsync, "NICE", nice)
+    monkeypatch.setattr(NetbootAsync, "IONICE", ionice)
+    monkeypatch.setattr(NetbootAsync, "CPUS", cpus)
+    monkeypatch.setattr(NetbootAsync, "CGROUP", cgroup)
+    assert NetbootAsync()._scheduled(list(COMMAND)) == expected
+
+
+def test_budget_wait(monkeypatch):
+    monkeypatch.setattr(NetbootAcceptQueue, "CONCURRENCY", 2)
+    monkeypatch.setattr(NetbootAcceptQueue, "RATE", 600.0)
+    # one token per 100 ms, no burst
+    monkeypatch.setattr(NetbootAcceptQueue, "budget", NetbootTokenBucket(600, 1))
+
+    async_cmds = FakeAsync()
+    queue = NetbootAcceptQueue(None, async_cmds)
+    messages = []
+    queue.submit("0000000D300002AF", messages.append, None)
+    queue.submit("0000000D300002B0", messages.append, None)
+
+    # a slot is free, but the second accept waits for the budget
+    assert set(async_cmds.notifies) == {"0000000D300002AF"}
+    assert [(e["status"], e["serial"]) for e in messages] == [
+        ("started", "0000000D300002AF"),
+        ("queued", "0000000D300002B0"),
+    ]
+    assert messages[1]["position"] == 1
+
+    for _ in range(100):
+        if "0000000D300002B0" in async_cmds.notifies:
+            break
+        time.sleep(0.02)
+    assert set(async_cmds.notifies) == {"0000000D300002AF", "0000000D300002B0"}
+
+    async_cmds.finish("0000000D300002AF")
+    async_cmds.finish("0000000D300002B0", "failed")
+    assert queue.jobs == {}
+
+    started = {e["serial"]: e for e in messages if e["status"] == "started"}
+    assert started["0000000D300002AF"]["budget_wait_ms"] == 0.0
+    assert 50.0 <= started["0000000D300002B0"]["budget_wait_ms"] < 2000.0
+    final = [e for e in messages if e["status"] in ("succeeded", "failed")]
+    assert all("budget_wait_ms" in e for e in final)
+
+    stages = {e["stage"]: e for e in async_cmds.stats.summary()}
+    assert stages["budget_wait"]["count"] == 2
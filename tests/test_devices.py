@@ -0,0 +1,154 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from foris_controller.app import app_info
+
+app_info["lock_backend"] = threading
+app_info.setdefault("modules", {})
+
+from foris_controller_backends.netboot import NetbootCmds, NetbootDeviceRegistry  # noqa: E402
+
+TEST_ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "test_root")
+# used by netboot-manager in test_root
+DEVICE_PATH = "/tmp/foris-controller-netboot-test"
+
+DEVICES = {
+    "0000000D300002AF": "incoming",
+    "0000000D30000299": "accepted",
+    "0000000D3000028E": "transfering",
+}
+
+
+@pytest.fixture
+def devices_dir():
+    shutil.rmtree(DEVICE_PATH, ignore_errors=True)
+    for serial, state in DEVICES.items():
+        os.makedirs(os.path.join(DEVICE_PATH, serial))
+        if state != "incoming":
+            with open(os.path.join(DEVICE_PATH, serial, state), "w") as f:
+                f.flush()
+
+    yield DEVICE_PATH
+
+    shutil.rmtree(DEVICE_PATH, ignore_errors=True)
+
+
+@pytest.fixture
+def commands(monkeypatch):
+    """ Runs commands from test_root, returns the list of the commands which were run """
+    run = []
+
+    def run_command(self, *args):
+        run.append(args)
+        process = subprocess.run(
+            [sys.executable, TEST_ROOT + args[0], *args[1:]], capture_output=True
+        )
+        return process.returncode, process.stdout, process.stderr
+
+    monkeypatch.setattr(NetbootCmds, "_run_command", run_command)
+    monkeypatch.setattr(NetbootCmds, "DEVICES_DIR", None)
+    return run
+
+
+def states(devices: list) -> dict:
+    assert len({e["serial"] for e in devices}) == len(devices)
+    return {e["serial"]: e["state"] for e in devices}
+
+
+def test_list(devices_dir, commands):
+    assert states(NetbootCmds().list()) == DEVICES
+    assert commands == [("/usr/bin/netboot-manager", "list-all", "-j")]
+
+
+def test_scan(devices_dir, commands, monkeypatch):
+    monkeypatch.setattr(NetbootCmds, "DEVICES_DIR", devices_dir)
+    assert states(NetbootCmds().list()) == DEVICES
+    assert commands == []
+
+    # missing directory
+    assert NetbootCmds()._scan(os.path.join(devices_dir, "missing")) is None
+
+
+def test_scan_fallback(devices_dir, commands, monkeypatch):
+    monkeypatch.setattr(NetbootCmds, "DEVICES_DIR", devices_dir)
+    with open(os.path.join(devices_dir, "unknown-file"), "w") as f:
+        f.flush()
+
+    # layout is not recognized, netboot-manager is used
+    assert NetbootCmds()._scan(devices_dir) is None
+    devices = states(NetbootCmds().list())
+    assert commands == [("/usr/bin/netboot-manager", "list-all", "-j")]
+    assert {k: v for k, v in devices.items() if k in DEVICES} == DEVICES
+
+    monkeypatch.setattr(NetbootCmds, "DEVICES_DIR", os.path.join(devices_dir, "missing"))
+    assert states(NetbootCmds().list()) == devices
+    assert len(commands) == 2
+
+
+def test_registry(devices_dir, commands):
+    registry = NetbootDeviceRegistry(NetbootCmds())
+    assert registry.state("0000000D30000299") == "accepted"
+    assert registry.state("0000000D300002AF") == "incoming"
+    assert registry.state("0000000D30000312") is None
+    assert states(registry.list()) == DEVICES
+    assert registry.stats() == {"hits": 3, "misses": 1, "size": 3}
+    assert len(commands) == 1
+
+    # explicit refresh
+    assert states(registry.list(refresh=True)) == DEVICES
+    assert registry.stats()["misses"] == 2
+
+
+def test_registry_invalidate(devices_dir, commands):
+    cmds = NetbootCmds()
+    registry = NetbootDeviceRegistry(cmds)
+    assert registry.state("0000000D30000299") == "accepted"
+
+    assert cmds.revoke("0000000D30000299")
+    # cached until invalidated
+    assert registry.state("0000000D30000299") == "accepted"
+    registry.invalidate()
+    assert registry.state("0000000D30000299") == "incoming"
+
+    assert cmds.accept("0000000D300002AF")
+    registry.invalidate()
+    assert registry.state("0000000D300002AF") == "accepted"
+    assert registry.stats() == {"hits": 1, "misses": 3, "size": 3}
+
+
+def test_registry_ttl(devices_dir, commands, monkeypatch):
+    registry = NetbootDeviceRegistry(NetbootCmds())
+    registry.state("0000000D30000299")
+    shutil.rmtree(os.path.join(devices_dir, "0000000D300002AF"))
+    assert registry.state("0000000D300002AF") == "incoming"
+
+    monkeypatch.setattr(NetbootDeviceRegistry, "TTL", 0.0)
+    registry.invalidate()
+    registry.state("0000000D30000299")
+    # expired immediately
+    assert registry.state("0000000D300002AF") is None
+    assert registry.stats()["misses"] == 3
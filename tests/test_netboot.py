@@ -199,6 +199,200 @@ def test_accept(infrastructure, start_buses, init_netboot_devices):
     assert {"serial": "0000000D3000028E", "state": "transfering"} in res["data"]["devices"]
 
 
+def test_accept_batch(infrastructure, start_buses, init_netboot_devices):
+    filters = [("netboot", "accept_batch")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "action": "accept_batch",
+            "kind": "request",
+            "data": {"serials": ["0000000D300002AF", "0000000D30000312", "0000000D300002AF"]},
+        }
+    )
+    assert "errors" not in res
+    batch_id = res["data"]["task_id"]
+    tasks = {e["serial"]: e["task_id"] for e in res["data"]["tasks"]}
+    assert len(res["data"]["tasks"]) == 2
+
+    check_accept_notification(infrastructure, tasks["0000000D300002AF"], "succeeded")
+    check_accept_notification(infrastructure, tasks["0000000D30000312"], "failed")
+
+    for i in range(1, 5):
+        notifications = infrastructure.get_notifications(notifications, filters=filters)
+        if notifications and notifications[-1]["data"]["task_id"] == batch_id:
+            break
+        time.sleep(0.1 * (i ** 2))
+    assert notifications[-1]["data"] == {
+        "task_id": batch_id,
+        "results": [
+            {
+                "serial": "0000000D300002AF",
+                "task_id": tasks["0000000D300002AF"],
+                "status": "succeeded",
+            },
+            {
+                "serial": "0000000D30000312",
+                "task_id": tasks["0000000D30000312"],
+                "status": "failed",
+            },
+        ],
+    }
+
+    res = infrastructure.process_message({"module": "netboot", "action": "list", "kind": "request"})
+    assert {"serial": "0000000D300002AF", "state": "accepted"} in res["data"]["devices"]
+
+
+def test_cancel_accept(infrastructure, start_buses, init_netboot_devices, backend_param):
+    def accept(serial):
+        return infrastructure.process_message(
+            {
+                "module": "netboot",
+                "action": "accept",
+                "kind": "request",
+                "data": {"serial": serial},
+            }
+        )["data"]["task_id"]
+
+    def cancel(task_id):
+        return infrastructure.process_message(
+            {
+                "module": "netboot",
+                "action": "cancel_accept",
+                "kind": "request",
+                "data": {"task_id": task_id},
+            }
+        )["data"]["result"]
+
+    assert cancel("FFFFFFFF") is False
+
+    if backend_param == "mock":
+        # mock accept finishes immediately, there is nothing to cancel
+        task_id = accept("0000000D300002AF")
+        check_accept_notification(infrastructure, task_id, "succeeded")
+        assert cancel(task_id) is False
+        return
+
+    # second incoming device
+    os.makedirs(os.path.join(init_netboot_devices, "0000000D300002B0"))
+
+    filters = [("netboot", "accept")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    # only one accept runs at once (FORIS_NETBOOT_ACCEPT_CONCURRENCY=1)
+    running_task_id = accept("0000000D300002AF")
+    queued_task_id = accept("0000000D300002B0")
+    assert queued_task_id != running_task_id
+    # duplicate request is attached to the running accept
+    assert accept("0000000D300002AF") == running_task_id
+
+    check_accept_notification(infrastructure, running_task_id, "started")
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert {
+        "task_id": queued_task_id,
+        "status": "queued",
+        "serial": "0000000D300002B0",
+        "position": 1,
+    } in [e["data"] for e in notifications]
+
+    # queued job is dropped
+    assert cancel(queued_task_id) is True
+    check_accept_notification(infrastructure, queued_task_id, "cancelled")
+    assert cancel(queued_task_id) is False
+
+    # running process is killed
+    assert cancel(running_task_id) is True
+    check_accept_notification(infrastructure, running_task_id, "cancelled")
+    assert cancel(running_task_id) is False
+
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert not [
+        e
+        for e in notifications
+        if e["data"]["task_id"] in (running_task_id, queued_task_id)
+        and e["data"]["status"] == "succeeded"
+    ]
+    assert not [
+        e
+        for e in notifications
+        if e["data"]["task_id"] == queued_task_id and e["data"]["status"] == "started"
+    ]
+
+    res = infrastructure.process_message({"module": "netboot", "action": "list", "kind": "request"})
+    assert {"serial": "0000000D300002AF", "state": "incoming"} in res["data"]["devices"]
+    assert {"serial": "0000000D300002B0", "state": "incoming"} in res["data"]["devices"]
+
+
+def test_accept_stats(infrastructure, start_buses, init_netboot_devices):
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "action": "accept",
+            "kind": "request",
+            "data": {"serial": "0000000D300002AF"},
+        }
+    )
+    check_accept_notification(infrastructure, res["data"]["task_id"], "succeeded")
+
+    res = infrastructure.process_message(
+        {"module": "netboot", "action": "accept_stats", "kind": "request"}
+    )
+    assert "errors" not in res
+    stages = {e["stage"]: e for e in res["data"]["stages"]}
+    assert "ca_ready" in stages
+    assert stages["ca_ready"]["count"] >= 1
+    assert stages["ca_ready"]["p50_ms"] <= stages["ca_ready"]["p95_ms"]
+    assert stages["ca_ready"]["p95_ms"] <= stages["ca_ready"]["max_ms"]
+
+
+def test_accept_inventory(infrastructure, start_buses, init_netboot_devices):
+    filters = [("netboot", "accept")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "action": "accept",
+            "kind": "request",
+            "data": {"serial": "0000000D300002AF"},
+        }
+    )
+    task_id = res["data"]["task_id"]
+    check_accept_notification(infrastructure, task_id, "succeeded")
+
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    succeeded = [
+        e["data"]
+        for e in notifications
+        if e["data"]["task_id"] == task_id and e["data"]["status"] == "succeeded"
+    ][0]
+    assert "ip" in succeeded
+    assert "mac" in succeeded
+    assert succeeded["controller_id"] == "0000000D300002AF"
+
+    res = infrastructure.process_message({"module": "netboot", "action": "list", "kind": "request"})
+    assert {
+        "serial": "0000000D300002AF",
+        "state": "accepted",
+        "ip": succeeded["ip"],
+        "mac": succeeded["mac"],
+    } in res["data"]["devices"]
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "action": "revoke",
+            "kind": "request",
+            "data": {"serial": "0000000D300002AF"},
+        }
+    )
+    assert res["data"]["result"] is True
+
+    res = infrastructure.process_message({"module": "netboot", "action": "list", "kind": "request"})
+    assert {"serial": "0000000D300002AF", "state": "incoming"} in res["data"]["devices"]
+
+
 def test_commands_list(infrastructure, start_buses, init_netboot_devices):
     res = infrastructure.process_message(
         {"module": "netboot", "kind": "request", "action": "commands_list"}
@@ -499,3 +693,446 @@ def test_command_log(infrastructure, start_buses, init_netboot_devices):
     # success with different batch
     log_check("0000000D30000299", "batch02", "logged", "logged2", False, True)
     log_check("0000000D30000299", "batch02", "logged", "logged2", True, True)
+
+
+def test_commands_list_filtered(infrastructure, start_buses, init_netboot_devices):
+    for module in ["filtered1", "filtered2"]:
+        res = infrastructure.process_message(
+            {
+                "module": "netboot",
+                "kind": "request",
+                "action": "command_set",
+                "data": {
+                    "controller_id": "0000000D30000299",
+                    "command": {"module": module, "action": "action"},
+                },
+            }
+        )
+        assert res["data"]["result"] is True
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "commands_list",
+            "data": {"controller_ids": ["0000000D30000299"], "include_logs": False},
+        }
+    )
+    assert "errors" not in res
+    controllers = res["data"]["controllers"]
+    assert [e["controller_id"] for e in controllers] == ["0000000D30000299"]
+    assert "logs" not in controllers[0]
+    assert {"filtered1", "filtered2"} <= {e["module"] for e in controllers[0]["commands"]}
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "commands_list",
+            "data": {"controller_ids": ["0000000D30000299"]},
+        }
+    )
+    assert "logs" in res["data"]["controllers"][0]
+
+    # unknown controller
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "commands_list",
+            "data": {"controller_ids": ["0000000D30000312"]},
+        }
+    )
+    assert res["data"]["controllers"] == []
+
+
+def test_command_set_unset_bulk(infrastructure, start_buses, init_netboot_devices):
+    filters = [("netboot", "command_set_bulk"), ("netboot", "command_unset_bulk")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "command_set_bulk",
+            "data": {
+                "commands": [
+                    {
+                        "controller_id": "0000000D30000299",
+                        "command": {"module": "bulk", "action": "bulk1", "data": {"some": "data"}},
+                    },
+                    {
+                        "controller_id": "0000000D30000299",
+                        "command": {"module": "bulk", "action": "bulk2"},
+                    },
+                    # incoming
+                    {
+                        "controller_id": "0000000D300002AF",
+                        "command": {"module": "bulk", "action": "bulk1"},
+                    },
+                ]
+            },
+        }
+    )
+    assert [e["result"] for e in res["data"]["results"]] == [True, True, False]
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1]["action"] == "command_set_bulk"
+    assert [e["command"]["action"] for e in notifications[-1]["data"]["commands"]] == [
+        "bulk1",
+        "bulk2",
+    ]
+    assert "stored_time" in notifications[-1]["data"]["commands"][0]["command"]
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "commands_list",
+            "data": {"controller_ids": ["0000000D30000299"]},
+        }
+    )
+    commands = res["data"]["controllers"][0]["commands"]
+    assert {"bulk1", "bulk2"} <= {e["action"] for e in commands if e["module"] == "bulk"}
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "command_unset_bulk",
+            "data": {
+                "commands": [
+                    {"controller_id": "0000000D30000299", "module": "bulk", "action": "bulk1"},
+                    {"controller_id": "0000000D30000299", "module": "bulk", "action": "bulk1"},
+                    {"controller_id": "0000000D30000299", "module": "bulk", "action": "bulk3"},
+                ]
+            },
+        }
+    )
+    assert [e["result"] for e in res["data"]["results"]] == [True, False, False]
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1] == {
+        "module": "netboot",
+        "action": "command_unset_bulk",
+        "kind": "notification",
+        "data": {
+            "commands": [
+                {"controller_id": "0000000D30000299", "module": "bulk", "action": "bulk1"}
+            ]
+        },
+    }
+
+
+def test_command_log_batch(infrastructure, start_buses, init_netboot_devices):
+    filters = [("netboot", "command_log_batch")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "command_set",
+            "data": {
+                "controller_id": "0000000D30000299",
+                "command": {"module": "logged", "action": "batch1"},
+            },
+        }
+    )
+    assert res["data"]["result"] is True
+
+    records = [
+        {"module": "logged", "action": "batch1", "result": True},
+        {"module": "logged", "action": "missing", "result": True},
+        {"module": "logged", "action": "batch1", "result": False},
+    ]
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "command_log_batch",
+            "data": {
+                "controller_id": "0000000D30000299",
+                "batch_id": "batch03",
+                "records": records,
+            },
+        }
+    )
+    assert res["data"]["results"] == [True, False, True]
+
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1]["data"]["batch_id"] == "batch03"
+    assert [e["result"] for e in notifications[-1]["data"]["records"]] == [True, False]
+    assert all("when_stored" in e for e in notifications[-1]["data"]["records"])
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "commands_list",
+            "data": {"controller_ids": ["0000000D30000299"]},
+        }
+    )
+    batches = [e for e in res["data"]["controllers"][0]["logs"] if e["batch_id"] == "batch03"]
+    assert len(batches) == 1
+    assert [e["result"] for e in batches[0]["records"]] == [True, False]
+
+    # controller not accepted
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "command_log_batch",
+            "data": {
+                "controller_id": "0000000D300002AF",
+                "batch_id": "batch03",
+                "records": records,
+            },
+        }
+    )
+    assert res["data"]["results"] == [False, False, False]
+
+
+def test_command_options(infrastructure, start_buses, init_netboot_devices):
+    command = {
+        "module": "options",
+        "action": "slow",
+        "data": {"reload": True},
+        "timeout_ms": 30000,
+        "retries": 2,
+        "priority": 1,
+        "after": ["options.fast"],
+    }
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "command_set",
+            "data": {"controller_id": "0000000D30000299", "command": command},
+        }
+    )
+    assert res["data"]["result"] is True
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "command_log",
+            "data": {
+                "controller_id": "0000000D30000299",
+                "batch_id": "batch04",
+                "record": {"module": "options", "action": "slow", "result": True, "attempts": 3},
+            },
+        }
+    )
+    assert res["data"]["result"] is True
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "commands_list",
+            "data": {"controller_ids": ["0000000D30000299"]},
+        }
+    )
+    controller = res["data"]["controllers"][0]
+    stored = [e for e in controller["commands"] if e["module"] == "options"][0]
+    assert stored["timeout_ms"] == 30000
+    assert stored["retries"] == 2
+    assert stored["priority"] == 1
+    assert stored["after"] == ["options.fast"]
+    batch = [e for e in controller["logs"] if e["batch_id"] == "batch04"][0]
+    assert batch["records"][-1]["attempts"] == 3
+
+    # options are removed when the command is stored without them
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "command_set",
+            "data": {
+                "controller_id": "0000000D30000299",
+                "command": {"module": "options", "action": "slow"},
+            },
+        }
+    )
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "commands_list",
+            "data": {"controller_ids": ["0000000D30000299"], "include_logs": False},
+        }
+    )
+    stored = [e for e in res["data"]["controllers"][0]["commands"] if e["module"] == "options"][0]
+    assert "timeout_ms" not in stored
+    assert "retries" not in stored
+    assert "priority" not in stored
+    assert "after" not in stored
+
+
+def test_applied_set(infrastructure, start_buses, init_netboot_devices):
+    filters = [("netboot", "applied_set")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "command_set",
+            "data": {
+                "controller_id": "0000000D30000299",
+                "command": {"module": "applied", "action": "applied1"},
+            },
+        }
+    )
+    assert res["data"]["result"] is True
+
+    fingerprints = {"applied.applied1": "0123456789abcdef"}
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "applied_set",
+            "data": {"controller_id": "0000000D30000299", "fingerprints": fingerprints},
+        }
+    )
+    assert res["data"]["result"] is True
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1]["data"] == {
+        "controller_id": "0000000D30000299",
+        "fingerprints": fingerprints,
+    }
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "commands_list",
+            "data": {"controller_ids": ["0000000D30000299"]},
+        }
+    )
+    assert res["data"]["controllers"][0]["applied"] == fingerprints
+
+    # fingerprints are kept when commands are updated
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "command_set",
+            "data": {
+                "controller_id": "0000000D30000299",
+                "command": {"module": "applied", "action": "applied2"},
+            },
+        }
+    )
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "commands_list",
+            "data": {"controller_ids": ["0000000D30000299"]},
+        }
+    )
+    assert res["data"]["controllers"][0]["applied"] == fingerprints
+
+    # not accepted
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "applied_set",
+            "data": {"controller_id": "0000000D300002AF", "fingerprints": fingerprints},
+        }
+    )
+    assert res["data"]["result"] is False
+
+
+def test_applied_cleared(infrastructure, start_buses, init_netboot_devices, backend_param):
+    fingerprints = {"applied.applied1": "0123456789abcdef"}
+
+    def request(action: str, data: dict) -> dict:
+        return infrastructure.process_message(
+            {"module": "netboot", "kind": "request", "action": action, "data": data}
+        )["data"]
+
+    def applied() -> dict:
+        res = request("commands_list", {"controller_ids": ["0000000D30000299"]})
+        return res["controllers"][0].get("applied", {})
+
+    def accept():
+        task_id = request("accept", {"serial": "0000000D30000299"})["task_id"]
+        check_accept_notification(infrastructure, task_id, "succeeded")
+
+    request(
+        "command_set",
+        {
+            "controller_id": "0000000D30000299",
+            "command": {"module": "applied", "action": "applied1"},
+        },
+    )
+    assert request(
+        "applied_set", {"controller_id": "0000000D30000299", "fingerprints": fingerprints}
+    )["result"]
+    assert applied() == fingerprints
+
+    # revoked device can be wiped, all commands are sent again after the next accept
+    assert request("revoke", {"serial": "0000000D30000299"})["result"] is True
+    assert applied() == {}
+    accept()
+    assert request(
+        "applied_set", {"controller_id": "0000000D30000299", "fingerprints": fingerprints}
+    )["result"]
+    assert applied() == fingerprints
+
+    if backend_param == "mock":
+        return
+
+    # revoked outside of the controller and accepted again
+    os.unlink(os.path.join(init_netboot_devices, "0000000D30000299", "accepted"))
+    accept()
+    assert applied() == {}
+
+
+def test_commands_list_revision(infrastructure, start_buses, init_netboot_devices):
+    res = infrastructure.process_message(
+        {"module": "netboot", "kind": "request", "action": "commands_list"}
+    )
+    assert "controllers" in res["data"]
+    revision = res["data"]["revision"]
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "commands_list",
+            "data": {"if_revision": revision},
+        }
+    )
+    assert res["data"] == {"not_modified": True, "revision": revision}
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "command_set",
+            "data": {
+                "controller_id": "0000000D30000299",
+                "command": {"module": "revision", "action": "revision1"},
+            },
+        }
+    )
+    assert res["data"]["result"] is True
+
+    res = infrastructure.process_message(
+        {
+            "module": "netboot",
+            "kind": "request",
+            "action": "commands_list",
+            "data": {"if_revision": revision},
+        }
+    )
+    assert "not_modified" not in res["data"]
+    assert res["data"]["revision"] > revision
+    controllers = [
+        e for e in res["data"]["controllers"] if e["controller_id"] == "0000000D30000299"
+    ]
+    assert controllers[0]["revision"] == res["data"]["revision"]
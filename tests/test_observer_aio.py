@@ -0,0 +1,158 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import argparse
+import asyncio
+
+import pytest
+
+from foris_controller_netboot_module.observer.aio import AsyncObserver, RequestError
+from foris_controller_netboot_module.observer.retry import RetryTracker
+
+HOST = "0000000D30000001"
+DEVICE = "0000000D30000002"
+
+
+class FakeClient(object):
+    def __init__(self, commands_list):
+        self.commands_list = commands_list
+        self.requests = []
+        self.blocked = None
+
+    async def request(self, controller_id, module, action, data, timeout_ms=None):
+        self.requests.append((controller_id, module, action))
+        if self.blocked:
+            await self.blocked.wait()
+        if action == "commands_list":
+            if isinstance(self.commands_list, Exception):
+                raise self.commands_list
+            return self.commands_list
+        return {"result": True}
+
+
+def observer(client: FakeClient, workers: int = 1, ingress_size: int = 16) -> AsyncObserver:
+    options = argparse.Namespace(
+        full_replay=False, command_concurrency=2, workers=workers, ingress_size=ingress_size
+    )
+    observer = AsyncObserver(options, HOST, RetryTracker(30.0, 3600.0, 16, 3600.0))
+    observer.client = client
+    return observer
+
+
+def advertize(observer: AsyncObserver, controller_id: str):
+    observer._advertized(
+        f"foris-controller/{controller_id}/notification/remote/action/advertize",
+        {"module": "remote", "action": "advertize", "data": {"netboot": "booted"}},
+    )
+
+
+def provision(client: FakeClient) -> bool:
+    async def run() -> bool:
+        obs = observer(client)
+        advertize(obs, DEVICE)
+        await obs._dispatch()
+        await obs.tasks[DEVICE]
+        assert obs.tasks == {}
+        # failed runs are backed off
+        return obs.retry.entries[DEVICE][1] == 0
+
+    return asyncio.run(run())
+
+
+def test_provision():
+    client = FakeClient(
+        {
+            "controllers": [
+                {
+                    "controller_id": DEVICE,
+                    "commands": [{"module": "mod", "action": "act", "data": {}}],
+                    "applied": {},
+                }
+            ]
+        }
+    )
+    assert provision(client)
+    assert [e[2] for e in client.requests] == [
+        "commands_list",
+        "act",
+        "command_log_batch",
+        "applied_set",
+        "set_netboot_configured",
+    ]
+
+
+@pytest.mark.parametrize(
+    "commands_list",
+    [
+        RequestError("timeout"),
+        {},
+        {"controllers": [{"controller_id": DEVICE}]},
+        {"controllers": None},
+        None,
+    ],
+)
+def test_provision_unexpected_reply(commands_list):
+    client = FakeClient(commands_list)
+    assert not provision(client)
+    assert [e[2] for e in client.requests] == ["commands_list"]
+
+
+def test_provision_without_commands():
+    # controllers without stored commands are not listed
+    client = FakeClient({"controllers": []})
+    assert provision(client)
+    assert client.requests == [
+        (HOST, "netboot", "commands_list"),
+        (DEVICE, "remote", "set_netboot_configured"),
+    ]
+
+
+def test_dispatch_bounded():
+    devices = [f"0000000D3000001{i}" for i in range(4)]
+
+    async def run():
+        client = FakeClient({"controllers": []})
+        client.blocked = asyncio.Event()
+        obs = observer(client, workers=1, ingress_size=2)
+        for controller_id in devices:
+            advertize(obs, controller_id)
+        # queue is full
+        assert list(obs.pending) == devices[:2]
+
+        await obs._dispatch()
+        assert list(obs.tasks) == devices[:1]
+        # devices wait in the queue until a worker is free (advertisements are coalesced)
+        advertize(obs, devices[1])
+        advertize(obs, devices[2])
+        assert list(obs.pending) == devices[1:3]
+        await asyncio.sleep(0)
+        assert list(obs.retry.entries) == devices[:1]
+
+        client.blocked.set()
+        await obs.tasks[devices[0]]
+        assert obs.wakeup.is_set()
+        await obs._dispatch()
+        assert list(obs.tasks) == devices[1:2]
+        await obs.tasks[devices[1]]
+        await obs._dispatch()
+        await obs.tasks[devices[2]]
+        assert list(obs.retry.entries) == devices[:3]
+        assert not obs.pending and not obs.tasks
+
+    asyncio.run(run())
@@ -0,0 +1,195 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import concurrent.futures
+import threading
+
+import pytest
+
+from foris_controller_netboot_module.observer.cache import CommandsCache
+
+CONTROLLER1 = "0000000D30000001"
+CONTROLLER2 = "0000000D30000002"
+
+
+def command(action: str, **fields) -> dict:
+    return dict(module="mod", action=action, **fields)
+
+
+class Fetch(object):
+    """ commands_list which can be blocked until released """
+
+    def __init__(self, controllers: list):
+        self.controllers = controllers
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self) -> list:
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        return self.controllers
+
+
+def test_fill_single_flight():
+    cache = CommandsCache()
+    fetch = Fetch([{"controller_id": CONTROLLER1, "commands": [command("a")], "applied": {}}])
+    fetch.release.clear()
+
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(cache.get, CONTROLLER1, fetch) for _ in range(4)]
+        assert fetch.started.wait(5)
+        # received while the cache is being filled
+        cache.notification(
+            "command_set", {"controller_id": CONTROLLER1, "command": command("b")}
+        )
+        fetch.release.set()
+        results = [e.result() for e in futures]
+
+    assert fetch.calls == 1
+    assert all([e["action"] for e in res["commands"]] == ["a", "b"] for res in results)
+    assert [e["action"] for e in cache.get(CONTROLLER1, fetch)["commands"]] == ["a", "b"]
+    assert fetch.calls == 1
+
+
+def test_invalidated_while_filling():
+    cache = CommandsCache()
+    fetch = Fetch([{"controller_id": CONTROLLER1, "commands": [command("a")]}])
+    fetch.release.clear()
+
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        future = executor.submit(cache.get, CONTROLLER1, fetch)
+        assert fetch.started.wait(5)
+        cache.invalidate()
+        fetch.release.set()
+        # result is returned, but it is not kept
+        assert future.result()["commands"] == [command("a")]
+
+    assert cache.controllers is None
+    cache.get(CONTROLLER1, fetch)
+    assert fetch.calls == 2
+    assert cache.controllers is not None
+
+
+def test_failed_fill():
+    cache = CommandsCache()
+
+    def fetch():
+        raise KeyError("controllers")
+
+    with pytest.raises(KeyError):
+        cache.get(CONTROLLER1, fetch)
+    assert cache.controllers is None and cache.pending is None
+    # fill is not blocked by the failed one
+    assert cache.get(CONTROLLER1, Fetch([])) == {"commands": [], "applied": {}}
+
+
+def test_notifications():
+    cache = CommandsCache()
+    fetch = Fetch(
+        [
+            {
+                "controller_id": CONTROLLER1,
+                "commands": [command("a", data={"x": 1}), command("b")],
+                "applied": {"mod.a": "fingerprint"},
+            }
+        ]
+    )
+    # not filled yet, nothing to patch
+    cache.notification("command_set", {"controller_id": CONTROLLER1, "command": command("c")})
+    assert cache.get(CONTROLLER1, fetch)["commands"] == [command("a", data={"x": 1}), command("b")]
+
+    cache.notification(
+        "command_set", {"controller_id": CONTROLLER1, "command": command("a", data={"x": 2})}
+    )
+    cache.notification(
+        "command_set_bulk",
+        {
+            "commands": [
+                {"controller_id": CONTROLLER1, "command": command("c")},
+                {"controller_id": CONTROLLER2, "command": command("a")},
+            ]
+        },
+    )
+    cache.notification(
+        "command_unset", {"controller_id": CONTROLLER1, "module": "mod", "action": "b"}
+    )
+    controller = cache.get(CONTROLLER1, fetch)
+    # updated command keeps its position
+    assert controller["commands"] == [command("a", data={"x": 2}), command("c")]
+    assert controller["applied"] == {"mod.a": "fingerprint"}
+    assert cache.get(CONTROLLER2, fetch) == {"commands": [command("a")], "applied": {}}
+
+    cache.notification(
+        "command_unset_bulk",
+        {"commands": [{"controller_id": CONTROLLER2, "module": "mod", "action": "a"}]},
+    )
+    cache.notification(
+        "applied_set", {"controller_id": CONTROLLER1, "fingerprints": {"mod.c": "other"}}
+    )
+    # unrelated notifications are ignored
+    cache.notification("command_log", {"controller_id": CONTROLLER1, "batch_id": "1"})
+    assert cache.get(CONTROLLER1, fetch)["applied"] == {"mod.c": "other"}
+    assert cache.get(CONTROLLER2, fetch)["commands"] == []
+    assert fetch.calls == 1
+
+    # returned records are copies
+    cache.get(CONTROLLER1, fetch)["commands"].clear()
+    assert len(cache.get(CONTROLLER1, fetch)["commands"]) == 2
+
+
+def test_applied_cleared():
+    cache = CommandsCache()
+    fetch = Fetch(
+        [
+            {"controller_id": e, "commands": [command("a")], "applied": {"mod.a": "fingerprint"}}
+            for e in (CONTROLLER1, CONTROLLER2)
+        ]
+    )
+    cache.get(CONTROLLER1, fetch)
+
+    cache.notification("revoke", {"serial": CONTROLLER1})
+    cache.notification("accept", {"task_id": "1", "status": "started", "serial": CONTROLLER2})
+    assert cache.get(CONTROLLER1, fetch)["applied"] == {}
+    assert cache.get(CONTROLLER2, fetch)["applied"] == {"mod.a": "fingerprint"}
+
+    cache.notification("accept", {"task_id": "1", "status": "succeeded", "serial": CONTROLLER2})
+    assert cache.get(CONTROLLER2, fetch)["applied"] == {}
+    # unknown controllers are not added
+    cache.notification("revoke", {"serial": "0000000D30000003"})
+    assert set(cache.controllers) == {CONTROLLER1, CONTROLLER2}
+
+
+def test_invalidate():
+    cache = CommandsCache()
+    fetch = Fetch([{"controller_id": CONTROLLER1, "commands": [command("a")], "applied": {}}])
+    cache.get(CONTROLLER1, fetch)
+    cache.get(CONTROLLER1, fetch)
+    assert fetch.calls == 1
+
+    cache.invalidate()
+    # notifications are not applied to the invalidated cache
+    cache.notification("command_set", {"controller_id": CONTROLLER1, "command": command("b")})
+    fetch.controllers = [
+        {"controller_id": CONTROLLER1, "commands": [command("a"), command("c")], "applied": {}}
+    ]
+    assert cache.get(CONTROLLER1, fetch)["commands"] == [command("a"), command("c")]
+    assert fetch.calls == 2
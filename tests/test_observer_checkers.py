@@ -0,0 +1,195 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import json
+import sys
+
+import pytest
+
+from foris_controller_netboot_module.observer import checkers, commands
+from foris_controller_netboot_module.observer.checkers import (
+    CheckerError,
+    compile_checker,
+    load_checkers,
+)
+
+
+class FakeEntryPoint(object):
+    def __init__(self, name, obj):
+        self.name = name
+        self.value = f"fake:{name}"
+        self.obj = obj
+
+    def load(self):
+        if isinstance(self.obj, Exception):
+            raise self.obj
+        return self.obj
+
+
+def test_schema():
+    checker = compile_checker(
+        {
+            "schema": {
+                "type": "object",
+                "properties": {"result": {"const": True}, "ip": {"type": "string"}},
+                "required": ["result"],
+            }
+        }
+    )
+    assert checker({"result": True})
+    assert checker({"result": True, "ip": "10.0.0.1"})
+    assert not checker({"result": False})
+    assert not checker({"result": True, "ip": 1})
+    assert not checker({})
+    assert not checker(None)
+
+
+def test_invalid_schema():
+    with pytest.raises(CheckerError):
+        compile_checker({"schema": {"type": "thing"}})
+    with pytest.raises(CheckerError):
+        compile_checker({"schema": {"required": "result"}})
+
+
+def test_predicates():
+    checker = compile_checker({"match": {"path": "result", "value": True}})
+    assert checker({"result": True})
+    assert not checker({"result": 1})  # JSON boolean is not a number
+    assert not checker({})
+    assert not checker(None)
+
+    checker = compile_checker({"match": {"path": "items.1.state", "in": ["ok", "done"]}})
+    assert checker({"items": [{}, {"state": "done"}]})
+    assert not checker({"items": [{}, {"state": "failed"}]})
+    assert not checker({"items": [{}]})
+    assert not checker({"items": {"state": "ok"}})
+
+    # numeric segment works for object keys too
+    checker = compile_checker({"match": {"path": "codes.0", "value": 0}})
+    assert checker({"codes": [0]})
+    assert checker({"codes": {"0": 0}})
+
+    checker = compile_checker({"match": {"path": "errors", "exists": False}})
+    assert checker({"result": True})
+    assert not checker({"errors": []})
+
+
+def test_combined():
+    checker = compile_checker(
+        {
+            "schema": {"type": "object", "required": ["result"]},
+            "match": [{"path": "result", "value": True}, {"path": "ip", "exists": True}],
+        }
+    )
+    assert checker({"result": True, "ip": "10.0.0.1"})
+    assert not checker({"result": True})
+    assert not checker({"result": False, "ip": "10.0.0.1"})
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        {},
+        {"checks": []},
+        {"match": {"value": True}},
+        {"match": {"path": "result"}},
+        {"match": [{"path": "result", "value": True}], "extra": 1},
+        "result",
+    ],
+)
+def test_invalid_spec(spec):
+    with pytest.raises(CheckerError):
+        compile_checker(spec)
+
+
+def test_callable():
+    def checker(data):
+        return data == "ok"
+
+    assert compile_checker(checker) is checker
+
+
+def test_load_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkers, "_entry_points", lambda: [])
+    path = tmp_path / "checkers.json"
+    path.write_text(json.dumps({"mod.act": {"match": {"path": "state", "value": "ok"}}}))
+    loaded = load_checkers(str(path))
+    assert list(loaded) == ["mod.act"]
+    assert loaded["mod.act"]({"state": "ok"})
+    assert not loaded["mod.act"]({"state": "failed"})
+
+    assert load_checkers(None) == {}
+
+    with pytest.raises(CheckerError):
+        load_checkers(str(tmp_path / "missing.json"))
+
+    path.write_text("[]")
+    with pytest.raises(CheckerError):
+        load_checkers(str(path))
+
+    path.write_text(json.dumps({"mod.act": {"match": {}}}))
+    with pytest.raises(CheckerError):
+        load_checkers(str(path))
+
+
+def test_load_entry_points(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        checkers,
+        "_entry_points",
+        lambda: [
+            FakeEntryPoint("mod.spec", {"match": {"path": "state", "value": "ok"}}),
+            FakeEntryPoint("mod.func", lambda data: data == {}),
+            FakeEntryPoint("mod.broken", ImportError("missing")),
+            FakeEntryPoint("mod.invalid", {"match": {}}),
+            FakeEntryPoint("mod.override", lambda data: False),
+        ],
+    )
+    path = tmp_path / "checkers.json"
+    path.write_text(json.dumps({"mod.override": {"match": {"path": "state", "exists": True}}}))
+
+    loaded = load_checkers(str(path))
+    # broken entry points are skipped
+    assert sorted(loaded) == ["mod.func", "mod.override", "mod.spec"]
+    assert loaded["mod.spec"]({"state": "ok"})
+    assert loaded["mod.func"]({})
+    # file takes precedence
+    assert loaded["mod.override"]({"state": "any"})
+
+
+def test_check_result(monkeypatch):
+    monkeypatch.setattr(commands, "CHECK_RESULTS", dict(commands.CHECK_RESULTS))
+    command = {"module": "mod", "action": "act"}
+
+    # default checker
+    assert commands.check_result(command, {"result": True})
+    assert not commands.check_result(command, {"result": True, "ip": "10.0.0.1"})
+
+    checker = compile_checker({"match": {"path": "ip", "exists": True}})
+    commands.register_checkers({"mod.act": checker})
+    assert commands.check_result(command, {"result": True, "ip": "10.0.0.1"})
+    assert not commands.check_result(command, {"result": True})
+    assert not commands.check_result({"module": "mod", "action": "other"}, {"ip": "10.0.0.1"})
+
+
+def test_without_jsonschema(monkeypatch):
+    # import fails
+    monkeypatch.setitem(sys.modules, "jsonschema", None)
+    with pytest.raises(CheckerError):
+        compile_checker({"schema": {"type": "object"}})
+    assert compile_checker({"match": {"path": "result", "value": True}})({"result": True})
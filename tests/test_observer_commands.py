@@ -0,0 +1,84 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+from foris_controller_netboot_module.observer.commands import (
+    changed_commands,
+    command_fingerprint,
+)
+
+
+def command(action: str, **fields) -> dict:
+    return dict(module="mod", action=action, stored_time="2026-01-01T00:00:00", **fields)
+
+
+def test_fingerprint():
+    fingerprint = command_fingerprint(command("a", data={"x": 1, "y": [1, 2]}))
+    assert fingerprint == command_fingerprint(command("a", data={"y": [1, 2], "x": 1}))
+    # stored again (even with the same data)
+    assert fingerprint != command_fingerprint(
+        dict(command("a", data={"x": 1, "y": [1, 2]}), stored_time="2026-01-02T00:00:00")
+    )
+    assert fingerprint != command_fingerprint(command("a", data={"x": 2, "y": [1, 2]}))
+    assert fingerprint != command_fingerprint(command("b", data={"x": 1, "y": [1, 2]}))
+    # fields which don't change the command
+    assert fingerprint == command_fingerprint(
+        command("a", data={"x": 1, "y": [1, 2]}, module_version="1.0", retries=3)
+    )
+
+
+def test_changed_commands():
+    commands = [command("a"), command("b", data={"x": 1}), command("c")]
+    fingerprints = {f"mod.{e['action']}": command_fingerprint(e) for e in commands}
+
+    # nothing applied yet
+    selected, all_fingerprints, new_applied = changed_commands(
+        {"commands": commands, "applied": {}}, False
+    )
+    assert selected == commands
+    assert all_fingerprints == fingerprints
+    assert new_applied == {}
+
+    # changed and removed commands are dropped from applied
+    applied = {
+        "mod.a": fingerprints["mod.a"],
+        "mod.b": "outdated",
+        "mod.removed": "fingerprint",
+    }
+    selected, _, new_applied = changed_commands({"commands": commands, "applied": applied}, False)
+    assert [e["action"] for e in selected] == ["b", "c"]
+    assert new_applied == {"mod.a": fingerprints["mod.a"]}
+    assert "mod.b" in applied  # not modified
+
+    # everything applied
+    selected, _, new_applied = changed_commands(
+        {"commands": commands, "applied": fingerprints}, False
+    )
+    assert selected == []
+    assert new_applied == fingerprints
+
+
+def test_full_replay():
+    commands = [command("a"), command("b")]
+    fingerprints = {f"mod.{e['action']}": command_fingerprint(e) for e in commands}
+    selected, all_fingerprints, new_applied = changed_commands(
+        {"commands": commands, "applied": fingerprints}, True
+    )
+    assert selected == commands
+    assert all_fingerprints == fingerprints
+    assert new_applied == {}
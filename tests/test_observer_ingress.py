@@ -0,0 +1,68 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import threading
+
+from foris_controller_netboot_module.observer.ingress import CoalescingQueue
+
+
+def test_coalesce():
+    queue = CoalescingQueue(4)
+    assert queue.put("a", 1)
+    assert queue.put("b", 1)
+    # the latest item replaces the waiting one and keeps its position
+    assert queue.put("a", 2)
+    assert queue.put("a", 3)
+
+    assert queue.get() == ("a", 3)
+    assert queue.get() == ("b", 1)
+    assert (queue.coalesced, queue.dropped) == (2, 0)
+
+    # key which was taken is queued again
+    assert queue.put("a", 4)
+    assert queue.get() == ("a", 4)
+    assert queue.coalesced == 2
+
+
+def test_drop():
+    queue = CoalescingQueue(2)
+    assert queue.put("a", 1)
+    assert queue.put("b", 1)
+    assert not queue.put("c", 1)
+    # waiting keys are still updated when the queue is full
+    assert queue.put("b", 2)
+    assert queue.stats() == "size=2 coalesced=1 dropped=1"
+
+    assert queue.get() == ("a", 1)
+    assert queue.put("c", 2)
+    assert [queue.get(), queue.get()] == [("b", 2), ("c", 2)]
+    assert queue.stats() == "size=0 coalesced=1 dropped=1"
+
+
+def test_blocking_get():
+    queue = CoalescingQueue(2)
+    got = []
+    thread = threading.Thread(target=lambda: got.append(queue.get()))
+    thread.start()
+    thread.join(0.05)
+    assert thread.is_alive()
+
+    queue.put("a", 1)
+    thread.join(5)
+    assert got == [("a", 1)]
@@ -0,0 +1,107 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import threading
+import time
+
+from foris_controller_netboot_module.observer.pool import WorkerPool
+
+DELAY = 0.02
+
+
+class Recorder(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.done = threading.Semaphore(0)
+        self.events = []
+        self.running = {}
+        self.max_running = 0
+        self.max_running_per_key = 0
+
+    def item(self, key: str, value: int, fail: bool = False):
+        def run():
+            with self.lock:
+                self.running[key] = self.running.get(key, 0) + 1
+                self.max_running = max(self.max_running, sum(self.running.values()))
+                self.max_running_per_key = max(self.max_running_per_key, self.running[key])
+            time.sleep(DELAY)
+            with self.lock:
+                self.running[key] -= 1
+                self.events.append((key, value))
+            self.done.release()
+            if fail:
+                raise RuntimeError("failed")
+
+        return run
+
+    def wait(self, count: int):
+        for _ in range(count):
+            assert self.done.acquire(timeout=5)
+
+
+def idle(pool: WorkerPool) -> bool:
+    for _ in range(100):
+        with pool.lock:
+            if not pool.pending and pool.in_flight == 0:
+                return True
+        time.sleep(0.01)
+    return False
+
+
+def test_same_key_serialized():
+    pool = WorkerPool(4, "test")
+    recorder = Recorder()
+    for value in range(5):
+        pool.submit("a", recorder.item("a", value))
+    recorder.wait(5)
+
+    # processed one after another in the submitted order
+    assert recorder.events == [("a", value) for value in range(5)]
+    assert recorder.max_running_per_key == 1
+    assert idle(pool)
+    assert pool.queued == 0
+
+
+def test_keys_in_parallel():
+    pool = WorkerPool(3, "test")
+    recorder = Recorder()
+    for value in range(3):
+        for key in "abcde":
+            pool.submit(key, recorder.item(key, value))
+    recorder.wait(15)
+
+    assert recorder.max_running_per_key == 1
+    # bounded by the number of workers
+    assert 1 < recorder.max_running <= 3
+    for key in "abcde":
+        assert [v for k, v in recorder.events if k == key] == [0, 1, 2]
+    assert idle(pool)
+
+
+def test_failed_item():
+    pool = WorkerPool(1, "test")
+    recorder = Recorder()
+    pool.submit("a", recorder.item("a", 0, fail=True))
+    pool.submit("a", recorder.item("a", 1))
+    recorder.wait(2)
+
+    # the worker survives and the key is processed further
+    assert recorder.events == [("a", 0), ("a", 1)]
+    assert idle(pool)
+    assert all(thread.is_alive() for thread in pool.threads)
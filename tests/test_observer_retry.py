@@ -0,0 +1,134 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import json
+
+import pytest
+
+from foris_controller_netboot_module.observer import retry as retry_module
+from foris_controller_netboot_module.observer.retry import RetryTracker
+
+MIN_RETRY = 30.0
+MAX_RETRY = 200.0
+TTL = 3600.0
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(retry_module.time, "time", clock)
+    return clock
+
+
+def tracker(max_size: int = 16, path=None) -> RetryTracker:
+    return RetryTracker(MIN_RETRY, MAX_RETRY, max_size, TTL, path)
+
+
+def test_backoff(clock):
+    retry = tracker()
+    assert retry.start("a")
+    assert not retry.start("a")
+    clock.now += MIN_RETRY
+    assert retry.start("a")
+
+    # delay doubles after each failed run up to the maximum
+    for delay in (60.0, 120.0, MAX_RETRY, MAX_RETRY):
+        retry.finished("a", False)
+        clock.now += delay - 1
+        assert not retry.start("a")
+        clock.now += 1
+        assert retry.start("a")
+
+    # and it is reset after a successful one
+    retry.finished("a", True)
+    clock.now += MIN_RETRY
+    assert retry.start("a")
+
+    # devices are independent
+    assert retry.start("b")
+    # finishing an unknown device is ignored
+    retry.finished("c", False)
+    assert "c" not in retry.entries
+
+
+def test_eviction(clock):
+    retry = tracker(max_size=3)
+    for controller_id in "abc":
+        assert retry.start(controller_id)
+        clock.now += 1
+    retry.finished("a", False)
+    clock.now += MAX_RETRY
+    # "a" is the least recently started
+    assert retry.start("b")
+    assert retry.start("d")
+    assert list(retry.entries) == ["c", "b", "d"]
+
+    # devices which weren't seen for ttl are forgotten
+    clock.now += TTL
+    assert retry.start("e")
+    assert list(retry.entries) == ["e"]
+
+
+def test_persistence(clock, tmp_path):
+    path = str(tmp_path / "retry.json")
+    retry = tracker(path=path)
+    retry.start("a")
+    retry.finished("a", False)
+    retry.start("b")
+
+    loaded = tracker(path=path)
+    assert loaded.entries == retry.entries
+    assert not loaded.start("a")
+    clock.now += 2 * MIN_RETRY
+    assert loaded.start("a")
+
+    # expired entries are not loaded
+    clock.now += TTL
+    assert tracker(path=path).entries == {}
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "",
+        "{",
+        "[]",
+        "null",
+        json.dumps({"a": [1000000.0, 0], "b": 1}),
+        json.dumps({"a": [1000000.0]}),
+        json.dumps({"a": ["now", 0]}),
+        json.dumps({"a": {"last_run": 1000000.0, "failures": 0}}),
+    ],
+)
+def test_invalid_file(clock, tmp_path, content):
+    path = tmp_path / "retry.json"
+    path.write_text(content)
+    retry = tracker(path=str(path))
+    assert retry.entries == {}
+    # state is stored again
+    assert retry.start("a")
+    assert list(json.loads(path.read_text())) == ["a"]
@@ -0,0 +1,168 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from foris_controller_netboot_module.observer.schedule import (
+    command_dependencies,
+    run_commands,
+    run_commands_async,
+)
+
+DELAY = 0.02
+
+
+class Recorder(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = []
+        self.finished = []
+        self.running = 0
+        self.max_running = 0
+
+    def start(self, command: dict):
+        with self.lock:
+            self.started.append(command["action"])
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+    def finish(self, command: dict):
+        with self.lock:
+            self.finished.append(command["action"])
+            self.running -= 1
+
+    def send(self, command: dict) -> bool:
+        self.start(command)
+        time.sleep(DELAY)
+        self.finish(command)
+        return True
+
+    async def send_async(self, command: dict) -> bool:
+        self.start(command)
+        await asyncio.sleep(DELAY)
+        self.finish(command)
+        return True
+
+
+def run_sync(commands, limit):
+    recorder = Recorder()
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        results = list(run_commands(commands, recorder.send, executor, limit))
+    return recorder, results
+
+
+def run_async(commands, limit):
+    recorder = Recorder()
+
+    async def collect():
+        return [e async for e in run_commands_async(commands, recorder.send_async, limit)]
+
+    return recorder, asyncio.run(collect())
+
+
+@pytest.fixture(params=["sync", "async"])
+def run(request):
+    return run_sync if request.param == "sync" else run_async
+
+
+def command(action: str, **options) -> dict:
+    return dict(module="mod", action=action, **options)
+
+
+def test_dependencies():
+    commands = [
+        command("a"),
+        command("b", priority=1),
+        command("c", priority=0),
+        command("d", after=["mod.a", "mod.unknown"]),
+        command("e"),
+    ]
+    assert command_dependencies(commands) == [set(), {2}, set(), {0}, {0, 1, 2, 3}]
+
+
+def test_plain_commands_sequential(run):
+    commands = [command(e) for e in "abcd"]
+    recorder, results = run(commands, 4)
+    assert recorder.started == ["a", "b", "c", "d"]
+    assert recorder.max_running == 1
+    assert [e["action"] for e, _ in results] == ["a", "b", "c", "d"]
+    assert all(result for _, result in results)
+
+
+def test_priority(run):
+    commands = [
+        command("high1", priority=2),
+        command("low", priority=0),
+        command("high2", priority=2),
+        command("middle", priority=1),
+    ]
+    recorder, results = run(commands, 4)
+    assert recorder.started[:2] == ["low", "middle"]
+    assert set(recorder.started[2:]) == {"high1", "high2"}
+    # commands with the same priority are sent at once
+    assert recorder.max_running == 2
+    assert len(results) == 4
+
+
+def test_after(run):
+    commands = [
+        command("a", after=["mod.b"]),
+        command("b", after=["mod.c"]),
+        command("c", after=[]),
+        command("d", after=[]),
+    ]
+    recorder, _ = run(commands, 4)
+    assert recorder.started.index("c") < recorder.started.index("b")
+    assert recorder.started.index("b") < recorder.started.index("a")
+    assert recorder.finished.index("b") < recorder.started.index("a")
+    assert recorder.max_running == 2  # c and d
+
+
+def test_plain_command_waits_for_preceding(run):
+    commands = [command("a", priority=0), command("b", priority=0), command("plain")]
+    recorder, _ = run(commands, 4)
+    assert recorder.started[-1] == "plain"
+    assert recorder.finished.index("plain") == 2
+
+
+def test_cycle_fallback(run):
+    commands = [
+        command("a", after=["mod.b"]),
+        command("b", after=["mod.a"]),
+        command("c", priority=0),
+    ]
+    recorder, results = run(commands, 4)
+    assert sorted(recorder.started) == ["a", "b", "c"]
+    assert len(results) == 3
+
+
+def test_limit(run):
+    commands = [command(str(i), priority=0) for i in range(6)]
+    recorder, results = run(commands, 2)
+    assert recorder.max_running == 2
+    assert len(results) == 6
+
+    recorder, results = run(commands, 1)
+    assert recorder.max_running == 1
+    assert len(results) == 6
@@ -0,0 +1,118 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from foris_controller_netboot_module.observer.senders import SenderPool
+
+
+class FakeSender(object):
+    def __init__(self, timeout: int):
+        self.timeout = timeout
+        self.disconnected = False
+        self.in_use = threading.Lock()
+
+    def send(self):
+        assert self.in_use.acquire(blocking=False), "sender is used by two threads"
+        time.sleep(0.005)
+        self.in_use.release()
+
+    def disconnect(self):
+        self.disconnected = True
+
+
+class Factory(object):
+    def __init__(self):
+        self.created = []
+
+    def __call__(self, timeout: int) -> FakeSender:
+        sender = FakeSender(timeout)
+        self.created.append(sender)
+        return sender
+
+
+def test_reuse():
+    factory = Factory()
+    pool = SenderPool(factory, 4)
+
+    with pool.get(5000) as sender1:
+        assert sender1.timeout == 5000
+        with pool.get(5000) as sender2:
+            assert sender2 is not sender1
+            assert pool.stats() == {"idle": 0, "busy": 2}
+    assert pool.stats() == {"idle": 2, "busy": 0}
+
+    with pool.get(5000) as sender:
+        assert sender in (sender1, sender2)
+    with pool.get(1000) as sender:
+        assert sender.timeout == 1000
+    assert len(factory.created) == 3
+
+
+def test_idle_limit():
+    factory = Factory()
+    pool = SenderPool(factory, 2)
+
+    for timeout in (1000, 2000, 3000):
+        with pool.get(timeout):
+            pass
+    # the least recently used one is disconnected
+    assert [e.disconnected for e in factory.created] == [True, False, False]
+    assert pool.stats() == {"idle": 2, "busy": 0}
+
+    with pool.get(2000) as sender:
+        assert sender is factory.created[1]
+    assert len(factory.created) == 3
+
+    pool = SenderPool(factory, 0)
+    with pool.get(1000) as sender:
+        pass
+    assert sender.disconnected
+
+
+def test_failed_factory():
+    def factory(timeout):
+        raise ConnectionError()
+
+    pool = SenderPool(factory, 2)
+    with pytest.raises(ConnectionError):
+        with pool.get(1000):
+            pass
+    assert pool.stats() == {"idle": 0, "busy": 0}
+
+
+def test_threads():
+    factory = Factory()
+    pool = SenderPool(factory, 4)
+
+    def send(i: int):
+        with pool.get(1000 * (i % 3)) as sender:
+            sender.send()
+
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        list(executor.map(send, range(200)))
+
+    # senders are never used by two threads at once (checked in send) and don't leak
+    assert pool.stats()["busy"] == 0
+    assert pool.stats()["idle"] <= 4
+    assert sum(not e.disconnected for e in factory.created) == pool.stats()["idle"]
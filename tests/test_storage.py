@@ -0,0 +1,280 @@
+#
+# foris-controller-netboot-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import json
+import threading
+
+import pytest
+
+from foris_controller.app import app_info
+
+app_info["lock_backend"] = threading
+app_info.setdefault("modules", {})
+
+from foris_controller_backends.netboot import NetbootFiles, create_storage  # noqa: E402
+from foris_controller_backends.netboot.sqlite import NetbootSqlite  # noqa: E402
+
+CONTROLLER1 = "0000000D30000001"
+CONTROLLER2 = "0000000D30000002"
+
+
+@pytest.fixture
+def file_root(tmp_path, monkeypatch):
+    monkeypatch.setenv("FORIS_FILE_ROOT", str(tmp_path))
+    monkeypatch.setattr(NetbootFiles, "cache", {})
+    monkeypatch.setattr(NetbootFiles, "revisions", {})
+    monkeypatch.setattr(NetbootSqlite, "imported", False)
+    return tmp_path
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, file_root):
+    return create_storage(request.param)
+
+
+def commands_of(storage, controller_id: str) -> list:
+    _, controllers = storage.commands_list([controller_id], include_logs=False)
+    return [(e["module"], e["action"]) for e in controllers[0]["commands"]] if controllers else []
+
+
+def test_empty(storage):
+    revision, controllers = storage.commands_list()
+    assert controllers == []
+    assert storage.commands_list(if_revision=revision) == (revision, None)
+
+
+def test_set_unset(storage):
+    storage.command_set(CONTROLLER1, {"module": "mod", "action": "first", "data": {"a": 1}})
+    storage.command_set(
+        CONTROLLER1,
+        {"module": "mod", "action": "second", "timeout_ms": 100, "priority": 1, "after": ["x.y"]},
+    )
+    storage.command_set(CONTROLLER2, {"module": "mod", "action": "first"})
+
+    _, controllers = storage.commands_list()
+    assert [e["controller_id"] for e in controllers] == [CONTROLLER1, CONTROLLER2]
+    first, second = controllers[0]["commands"]
+    assert first["data"] == {"a": 1}
+    assert second["timeout_ms"] == 100
+    assert second["priority"] == 1
+    assert second["after"] == ["x.y"]
+    assert "data" not in second
+    assert {"module_version", "stored_time"} <= set(first)
+
+    # update keeps the position and drops unset options
+    storage.command_set(CONTROLLER1, {"module": "mod", "action": "first"})
+    _, controllers = storage.commands_list([CONTROLLER1])
+    assert "data" not in controllers[0]["commands"][0]
+    assert commands_of(storage, CONTROLLER1) == [("mod", "first"), ("mod", "second")]
+
+    assert storage.command_unset(CONTROLLER1, "mod", "first")
+    assert not storage.command_unset(CONTROLLER1, "mod", "first")
+    assert commands_of(storage, CONTROLLER1) == [("mod", "second")]
+
+    assert storage.command_unset_bulk(
+        [
+            {"controller_id": CONTROLLER1, "module": "mod", "action": "second"},
+            {"controller_id": CONTROLLER2, "module": "mod", "action": "missing"},
+        ]
+    ) == [True, False]
+    assert commands_of(storage, CONTROLLER1) == []
+    assert commands_of(storage, CONTROLLER2) == [("mod", "first")]
+
+
+def test_set_bulk(storage):
+    res = storage.command_set_bulk(
+        [
+            {"controller_id": CONTROLLER2, "command": {"module": "mod", "action": "a"}},
+            {"controller_id": CONTROLLER1, "command": {"module": "mod", "action": "b"}},
+            {"controller_id": CONTROLLER2, "command": {"module": "mod", "action": "c"}},
+        ]
+    )
+    assert len(res) == 3
+    _, controllers = storage.commands_list(include_logs=False)
+    assert [e["controller_id"] for e in controllers] == [CONTROLLER2, CONTROLLER1]
+    assert all("logs" not in e for e in controllers)
+    assert commands_of(storage, CONTROLLER2) == [("mod", "a"), ("mod", "c")]
+    assert commands_of(storage, CONTROLLER1) == [("mod", "b")]
+
+
+def test_logs(storage):
+    storage.command_set(CONTROLLER1, {"module": "mod", "action": "act"})
+    record = {"module": "mod", "action": "act", "result": True}
+    for i in range(12):
+        assert storage.command_log(CONTROLLER1, f"batch{i}", record)
+    assert storage.command_log_batch(
+        CONTROLLER1,
+        "batch11",
+        [dict(record, result=False, attempts=3), {"module": "mod", "action": "missing"}],
+    )[1] is None
+
+    _, controllers = storage.commands_list([CONTROLLER1])
+    logs = controllers[0]["logs"]
+    # only the latest 10 batches are kept
+    assert [e["batch_id"] for e in logs] == [f"batch{i}" for i in range(2, 12)]
+    assert [e["result"] for e in logs[-1]["records"]] == [True, False]
+    assert logs[-1]["records"][1]["attempts"] == 3
+    assert "when_stored" in logs[-1]["records"][0]
+
+
+def test_revisions(storage):
+    storage.command_set(CONTROLLER1, {"module": "mod", "action": "act"})
+    storage.command_set(CONTROLLER2, {"module": "mod", "action": "act"})
+    revision, controllers = storage.commands_list()
+    revisions = {e["controller_id"]: e["revision"] for e in controllers}
+    assert storage.commands_list(if_revision=revision) == (revision, None)
+
+    storage.command_log(CONTROLLER2, "batch", {"module": "mod", "action": "act", "result": True})
+    new_revision, controllers = storage.commands_list(if_revision=revision)
+    assert new_revision > revision
+    new_revisions = {e["controller_id"]: e["revision"] for e in controllers}
+    assert new_revisions[CONTROLLER1] == revisions[CONTROLLER1]
+    assert new_revisions[CONTROLLER2] > revisions[CONTROLLER2]
+
+
+def test_applied(storage):
+    assert not storage.applied_set(CONTROLLER1, {"mod.act": "abc"})
+    storage.command_set(CONTROLLER1, {"module": "mod", "action": "act"})
+    assert storage.applied_set(CONTROLLER1, {"mod.act": "abc"})
+    _, controllers = storage.commands_list([CONTROLLER1])
+    assert controllers[0]["applied"] == {"mod.act": "abc"}
+    assert commands_of(storage, CONTROLLER1) == [("mod", "act")]
+
+
+def test_sqlite_import(file_root):
+    files = NetbootFiles()
+    files.command_set(CONTROLLER2, {"module": "mod", "action": "a", "data": {"x": 1}})
+    files.command_set(CONTROLLER1, {"module": "mod", "action": "b", "retries": 2})
+    files.applied_set(CONTROLLER1, {"mod.b": "abc"})
+    _, expected = files.commands_list(include_logs=False)
+
+    _, imported = create_storage("sqlite").commands_list(include_logs=False)
+    for record in expected + imported:
+        del record["revision"]
+    assert imported == expected
+
+
+def test_migrate_legacy_file(storage, file_root):
+    legacy = [
+        {
+            "controller_id": CONTROLLER2,
+            "commands": [
+                {
+                    "module": "mod",
+                    "action": "a",
+                    "data": {"x": 1},
+                    "module_version": "1.0",
+                    "stored_time": "2026-01-01T00:00:00",
+                },
+                {
+                    "module": "mod",
+                    "action": "b",
+                    "module_version": "?",
+                    "stored_time": "2026-01-01T00:00:01",
+                },
+            ],
+        },
+        {"controller_id": CONTROLLER1, "commands": []},
+    ]
+    netboot_dir = file_root / "etc" / "netboot"
+    netboot_dir.mkdir(parents=True)
+    (netboot_dir / "commands.json").write_text(json.dumps(legacy))
+
+    _, controllers = storage.commands_list(include_logs=False)
+    assert [
+        {"controller_id": e["controller_id"], "commands": e["commands"]} for e in controllers
+    ] == legacy
+
+    # legacy file is kept aside and not migrated again
+    assert not (netboot_dir / "commands.json").exists()
+    assert (netboot_dir / "commands.json.migrated").exists()
+    assert (netboot_dir / "commands" / f"{CONTROLLER2}.json").exists()
+
+    storage.command_set(CONTROLLER1, {"module": "mod", "action": "c"})
+    assert commands_of(storage, CONTROLLER2) == [("mod", "a"), ("mod", "b")]
+    assert commands_of(storage, CONTROLLER1) == [("mod", "c")]
+
+
+def test_log_compaction(file_root, monkeypatch):
+    files = NetbootFiles()
+    journal = file_root / "tmp" / ".netboot" / "cmd-logs.journal"
+    for controller_id in (CONTROLLER1, CONTROLLER2):
+        files.command_set(controller_id, {"module": "mod", "action": "act"})
+    records = [
+        {"module": "mod", "action": "act", "result": True},
+        {"module": "mod", "action": "act", "result": False, "attempts": 2},
+    ]
+
+    def log(batches: range):
+        for i in batches:
+            for controller_id in (CONTROLLER1, CONTROLLER2):
+                files.command_log_batch(controller_id, f"batch{i}", records)
+
+    log(range(6))
+    assert journal.exists()
+    before = files.commands_list()
+
+    # folding the journal doesn't change the content
+    files._compact_logs()
+    assert not journal.exists()
+    assert files.commands_list() == before
+
+    # compact after each append (older batches are dropped from the 10-batch view)
+    monkeypatch.setattr(NetbootFiles, "LOGS_JOURNAL_MAX_SIZE", 1)
+    log(range(6, 14))
+    assert not journal.exists()
+    _, controllers = files.commands_list()
+    for controller, controller_before in zip(controllers, before[1]):
+        logs = controller["logs"]
+        assert [e["batch_id"] for e in logs] == [f"batch{i}" for i in range(4, 14)]
+        assert all([r["result"] for r in e["records"]] == [True, False] for e in logs)
+        assert logs[:2] == controller_before["logs"][4:6]
+
+    # batch split between the compacted logs and the journal is merged
+    monkeypatch.setattr(NetbootFiles, "LOGS_JOURNAL_MAX_SIZE", 64 * 1024)
+    files.command_log(CONTROLLER1, "batch13", records[0])
+    assert journal.exists()
+    _, controllers = files.commands_list([CONTROLLER1])
+    assert len(controllers[0]["logs"]) == 10
+    assert len(controllers[0]["logs"][-1]["records"]) == 3
+
+
+def test_revision_file(file_root):
+    files = NetbootFiles()
+    for controller_id in (CONTROLLER1, CONTROLLER2):
+        files.command_set(controller_id, {"module": "mod", "action": "act"})
+    # only the global counter is stored, per-controller revisions are kept in memory
+    stored = json.loads((file_root / "tmp" / ".netboot" / "revision.json").read_text())
+    revision, controllers = files.commands_list([CONTROLLER2])
+    assert stored == {"revision": revision}
+    assert controllers[0]["revision"] == revision
+
+
+def test_applied_clear(storage):
+    assert not storage.applied_clear(CONTROLLER1)
+    storage.command_set(CONTROLLER1, {"module": "mod", "action": "act"})
+    assert not storage.applied_clear(CONTROLLER1)
+    storage.applied_set(CONTROLLER1, {"mod.act": "abc"})
+    revision, _ = storage.commands_list()
+
+    assert storage.applied_clear(CONTROLLER1)
+    new_revision, controllers = storage.commands_list(if_revision=revision)
+    assert new_revision > revision
+    assert "applied" not in controllers[0]
+    assert commands_of(storage, CONTROLLER1) == [("mod", "act")]